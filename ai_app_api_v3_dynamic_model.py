@@ -9,14 +9,22 @@ import os
 from datetime import datetime
 
 import sys
+import io
 import json
+import re
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 # EXISTING IMPORTS
 from convert_html_to_text import html_to_text, get_text_summary_info
 from openai_summarizer_bullets import process_documents_bullets
-from extractors.file_processor import process_file
-from db_model import get_db_connection
+from extractors.file_processor import process_file_in_pool
+from db_model import get_db_connection, release_db_connection
+from utils.content_cache import content_hash, cache_get, cache_set
 
 # ===== NEW IMPORTS - ADD THESE 3 LINES =====
 from utils.template_analyzer import analyze_template
@@ -32,6 +40,24 @@ APPLICATION_ROOT = os.environ.get('APPL_PHYSICAL_PATH', '/')
 #     app.config['APPLICATION_ROOT'] = '/flaskai'
 
 
+def _write_stdout(payload):
+    """Write raw bytes straight to the stdout file descriptor (one WriteFile call under IIS)"""
+    # Push out any text already printed so it stays ahead of the response
+    sys.stdout.flush()
+    try:
+        fd = sys.stdout.fileno()
+    except (AttributeError, ValueError, io.UnsupportedOperation):
+        # No real descriptor (wrapped/redirected stdout): go through the buffered layer
+        sys.stdout.buffer.write(payload)
+        sys.stdout.buffer.flush()
+        return
+    
+    view = memoryview(payload)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+
 def return_json(data, status_code=200):
     """Helper function to return JSON response for CGI"""
     try:
@@ -44,20 +70,23 @@ def return_json(data, status_code=200):
             500: "Internal Server Error"
         }
         
-        # Send HTTP headers with CORS
-        print(f"Status: {status_code} {status_messages.get(status_code, 'Unknown')}")
-        print("Content-Type: application/json; charset=utf-8")
-        print("Access-Control-Allow-Origin: *")  # Add CORS
-        print("Access-Control-Allow-Methods: GET, POST, OPTIONS")
-        print("Access-Control-Allow-Headers: Content-Type")
-        print()
-        sys.stdout.flush()
+        # Headers and body go out as one preformatted byte string
+        headers = (
+            f"Status: {status_code} {status_messages.get(status_code, 'Unknown')}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            "Access-Control-Allow-Origin: *\r\n"  # Add CORS
+            "Access-Control-Allow-Methods: GET, POST, OPTIONS\r\n"
+            "Access-Control-Allow-Headers: Content-Type\r\n"
+            "\r\n"
+        ).encode('ascii')
+        
+        if orjson is not None:
+            json_output = orjson.dumps(data)
+        else:
+            json_output = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        log_debug(f"Sending JSON body: {len(json_output)} bytes")
         
-        # Send JSON body
-        json_output = json.dumps(data, ensure_ascii=False)
-        log_debug(f"Sending JSON body: {len(json_output)} characters")
-        print(json_output)
-        sys.stdout.flush()
+        _write_stdout(headers + json_output)
         
         log_debug("return_json completed successfully")
         
@@ -69,53 +98,71 @@ def return_json(data, status_code=200):
         print("Error generating response")
         sys.stdout.flush()
 
+# HTML declares itself near the start; only this many characters are sniffed
+HTML_SNIFF_LENGTH = 512
+_HTML_SNIFF_RE = re.compile(r'<(?:span|div|p>|table|html|body|!doctype)', re.IGNORECASE)
+
+
 def is_html_content(content):
     """Detect if content is HTML or a file path"""
     if not content:
         return False
     
-    content_lower = content.strip().lower()
-    html_indicators = ['<span', '<div', '<p>', '<table', '<html', '<body', '<!doctype']
-    if any(indicator in content_lower for indicator in html_indicators):
-        return True
-    
-    file_extensions = ['.pdf', '.docx', '.doc', '.jpg', '.jpeg', '.png', '.gif']
-    if any(content_lower.endswith(ext) for ext in file_extensions):
-        return False
+    # Decide from a short prefix; never strip or lowercase the whole (possibly multi-MB) value
+    head = content[:HTML_SNIFF_LENGTH].lstrip()
+    if not head:
+        head = content.lstrip()[:HTML_SNIFF_LENGTH]
+        if not head:
+            return False
     
-    if content_lower.startswith('<'):
+    if head[0] == '<':
         return True
     
-    return False
+    # Anything else is a file path/URL unless HTML tags follow a text preamble
+    return _HTML_SNIFF_RE.search(head) is not None
 
 
-def execute_sql_query(sql_query):
-    """Execute SQL query and return results"""
+def execute_sql_query(sql_query, params=None):
+    """Execute SQL query and return results
+
+    params: optional list of values bound to the query's ? placeholders, so
+    repeated query shapes reuse the server's cached plan.
+    """
+    conn = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute(sql_query)
+        if params:
+            cursor.execute(sql_query, tuple(params))
+        else:
+            cursor.execute(sql_query)
         
         columns = [column[0] for column in cursor.description]
+        # pyodbc reports the Python type as type_code; only these columns need formatting
+        datetime_cols = [i for i, column in enumerate(cursor.description) if column[1] is datetime]
         results = []
         
-        for row in cursor.fetchall():
-            row_dict = {}
-            for i, column in enumerate(columns):
-                value = row[i]
-                if isinstance(value, datetime):
-                    row_dict[column] = value.strftime('%Y-%m-%d %H:%M:%S')
-                else:
-                    row_dict[column] = value
-            results.append(row_dict)
+        while True:
+            rows = cursor.fetchmany(1000)
+            if not rows:
+                break
+            for row in rows:
+                row_dict = dict(zip(columns, row))
+                for i in datetime_cols:
+                    value = row[i]
+                    if value is not None:
+                        row_dict[columns[i]] = value.strftime('%Y-%m-%d %H:%M:%S')
+                results.append(row_dict)
         
         cursor.close()
-        conn.close()
         
         return results
         
     except Exception as e:
         raise Exception(f"Database error: {str(e)}")
+    
+    finally:
+        release_db_connection(conn)
 
 
 def document_summary():
@@ -131,11 +178,12 @@ def document_summary():
     content_length = int(os.environ.get("CONTENT_LENGTH", 0))
     print(content_length)
         
-    body = sys.stdin.read(content_length)        
+    body = sys.stdin.buffer.read(content_length)
 
     try:
         print("API Calling ...cls")
-        data = json.loads(body)
+        # Both parsers accept the raw UTF-8 bytes, so no decode copy is needed
+        data = orjson.loads(body) if orjson is not None else json.loads(body)
         print("================")
         print("Received JSON Payload : ", data)
         print("================")
@@ -152,6 +200,9 @@ def document_summary():
         sql_query = data.get('sql_query')
         summary_language = 'svenska'
         doc_template_query = data.get('doc_template_query', None)
+        # Optional values for ? placeholders in the two queries above
+        sql_params = data.get('sql_params', None)
+        doc_template_params = data.get('doc_template_params', None)
         
         # ===== NEW PARAMETER - ADD THIS LINE =====
         openai_model = data.get('openai_model', 'gpt-4o-mini')
@@ -170,6 +221,10 @@ def document_summary():
             return_json({"success": False, "error": "client_id is required"}, 400)
         if not sql_query:
             return_json({"success": False, "error": "sql_query is required"}, 400)
+        if sql_params is not None and not isinstance(sql_params, list):
+            return_json({"success": False, "error": "sql_params must be a list"}, 400)
+        if doc_template_params is not None and not isinstance(doc_template_params, list):
+            return_json({"success": False, "error": "doc_template_params must be a list"}, 400)
         
         print(f"\n{'='*70}")
         print(f"📥 Received request from .NET")
@@ -187,7 +242,7 @@ def document_summary():
         
         # Execute SQL query (existing)
         print(f"\n🔍 Executing SQL query...")
-        db_results = execute_sql_query(sql_query)
+        db_results = execute_sql_query(sql_query, sql_params)
         
         if not db_results or len(db_results) == 0:
             return_json({
@@ -211,96 +266,90 @@ def document_summary():
         html_docs = []
         file_docs = []
         
-        for idx, record in enumerate(db_results, 1):
-            doc_content = record.get('DocumentContent', '')
-            doc_name = record.get('DocumentName', f'Document {idx}')
-            doc_type = record.get('DocumentType', 'internal')
-            
-            if is_html_content(doc_content):
-                html_docs.append({
-                    'index': idx, 'name': doc_name, 'content': doc_content,
-                    'record': record, 'type': doc_type
-                })
-            else:
-                file_docs.append({
-                    'index': idx, 'name': doc_name, 'content': doc_content,
-                    'record': record, 'type': doc_type
-                })
-        
-        print(f"   HTML docs: {len(html_docs)}")
-        print(f"   File docs: {len(file_docs)}")
-        
-        # Process HTML documents (existing)
-        if html_docs:
-            print(f"\n📄 Processing {len(html_docs)} HTML documents...")
-            for doc in html_docs:
-                clean_text = html_to_text(doc['content'])
-                text_info = get_text_summary_info(clean_text)
+        from concurrent.futures import ThreadPoolExecutor
+        
+        def process_single_html(doc):
+            clean_text = html_to_text(doc['content'])
+            text_info = get_text_summary_info(clean_text)
+            return {
+                'success': True,
+                'name': doc['name'],
+                'text': clean_text,
+                'created_date': doc['record'].get('CreatedDate', 'N/A'),
+                'signed_date': doc['record'].get('SignedDate', 'N/A'),
+                'source_type': 'html',
+                'document_type': doc['type'],
+                'text_info': text_info
+            }
+        
+        def process_single_file(doc):
+            try:
+                result = process_file_in_pool(
+                    filename=doc['content'],
+                    base_path=base_path,
+                    ocr_language=ocr_language,
+                    try_ocr_if_empty=True
+                )
                 
-                processed_documents.append({
-                    'name': doc['name'],
-                    'text': clean_text,
-                    'created_date': doc['record'].get('CreatedDate', 'N/A'),
-                    'signed_date': doc['record'].get('SignedDate', 'N/A'),
-                    'source_type': 'html',
-                    'document_type': doc['type'],
-                    'text_info': text_info
-                })
-                print(f"   ✓ {doc['name']} - {text_info['word_count']} words")
-        
-        # Process file documents (existing)
-        if file_docs:
-            print(f"\n📁 Processing {len(file_docs)} file documents...")
-            from concurrent.futures import ThreadPoolExecutor, as_completed
-            
-            def process_single_file(doc):
-                try:
-                    result = process_file(
-                        filename=doc['content'],
-                        base_path=base_path,
-                        ocr_language=ocr_language,
-                        try_ocr_if_empty=True
-                    )
-                    
-                    if result['success']:
-                        text_info = get_text_summary_info(result['text'])
-                        return {
-                            'success': True,
-                            'name': doc['name'],
-                            'text': result['text'],
-                            'created_date': doc['record'].get('CreatedDate', 'N/A'),
-                            'signed_date': doc['record'].get('SignedDate', 'N/A'),
-                            'source_type': 'file',
-                            'document_type': doc['type'],
-                            'file_type': result['file_type'],
-                            'extraction_method': result['extraction_method'],
-                            'text_info': text_info
-                        }
-                    else:
-                        print(f"   ❌ {doc['name']} - FAILED")
-                        return {'success': False}
-                except Exception as e:
-                    print(f"   ❌ {doc['name']} - ERROR: {e}")
+                if result['success']:
+                    text_info = get_text_summary_info(result['text'], result.get('word_count'))
+                    return {
+                        'success': True,
+                        'name': doc['name'],
+                        'text': result['text'],
+                        'created_date': doc['record'].get('CreatedDate', 'N/A'),
+                        'signed_date': doc['record'].get('SignedDate', 'N/A'),
+                        'source_type': 'file',
+                        'document_type': doc['type'],
+                        'file_type': result['file_type'],
+                        'extraction_method': result['extraction_method'],
+                        'text_info': text_info
+                    }
+                else:
+                    print(f"   ❌ {doc['name']} - FAILED")
                     return {'success': False}
+            except Exception as e:
+                print(f"   ❌ {doc['name']} - ERROR: {e}")
+                return {'success': False}
+        
+        def dispatch_document(doc):
+            if doc['is_html']:
+                return process_single_html(doc)
+            return process_single_file(doc)
+        
+        # Classify and submit in one pass: HTML parsing overlaps with file I/O and OCR.
+        # PDF/image extraction is handed to a process pool by process_file_in_pool, so these
+        # threads mostly wait on it or on disk/network; the pool is wider than the core count.
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = []
             
-            with ThreadPoolExecutor(max_workers=4) as executor:
-                future_to_doc = {executor.submit(process_single_file, doc): doc for doc in file_docs}
+            for idx, record in enumerate(db_results, 1):
+                doc_content = record.get('DocumentContent', '')
+                doc = {
+                    'index': idx,
+                    'name': record.get('DocumentName', f'Document {idx}'),
+                    'content': doc_content,
+                    'record': record,
+                    'type': record.get('DocumentType', 'internal'),
+                    'is_html': is_html_content(doc_content)
+                }
                 
-                for future in as_completed(future_to_doc):
-                    result = future.result()
-                    if result['success']:
-                        processed_documents.append({
-                            'name': result['name'],
-                            'text': result['text'],
-                            'created_date': result['created_date'],
-                            'signed_date': result['signed_date'],
-                            'source_type': result['source_type'],
-                            'document_type': result['document_type'],
-                            'file_type': result['file_type'],
-                            'extraction_method': result['extraction_method'],
-                            'text_info': result['text_info']
-                        })
-                        print(f"   ✓ {result['name']} - {result['text_info']['word_count']} words")
+                if doc['is_html']:
+                    html_docs.append(doc)
+                else:
+                    file_docs.append(doc)
+                
+                futures.append(executor.submit(dispatch_document, doc))
+            
+            print(f"   HTML docs: {len(html_docs)}")
+            print(f"   File docs: {len(file_docs)}")
+            
+            # Collect in submission order so documents keep their DB order
+            for future in futures:
+                result = future.result()
+                if result.pop('success'):
+                    processed_documents.append(result)
+                    print(f"   ✓ {result['name']} - {result['text_info']['word_count']} words")
         
         print(f"\n✅ Successfully processed {len(processed_documents)} documents")
         
@@ -324,7 +373,7 @@ def document_summary():
             
             # Step 1: Fetch template from database
             print(f"🔍 Fetching template from database...")
-            template_results = execute_sql_query(doc_template_query)
+            template_results = execute_sql_query(doc_template_query, doc_template_params)
             
             if not template_results or len(template_results) == 0:
                 return_json({
@@ -361,19 +410,33 @@ def document_summary():
             # Get client IP address for logging
             ip_address = os.environ.get('REMOTE_ADDR', '0.0.0.0')
             
-            ai_result = generate_section_specific_summaries(
-                documents=processed_documents,
-                section_names=section_names,
-                model=openai_model,
-                max_tokens=max_tokens,
-                ip_address=ip_address,
-                
-                client_int_doc_ids=client_int_doc_ids,
-                journal_doc_ids=journal_doc_ids,
-                internal_doc_id=internal_doc_id,
-                client_id=client_id, cust_id=cust_id, user_id=user_id
-                
+            # Same client + model + documents + sections as an earlier request -> reuse its bullets
+            doc_hashes = [content_hash(doc['text']) for doc in processed_documents]
+            sections_cache_key = content_hash(
+                'section_summaries', cust_id, client_id, openai_model, max_tokens,
+                *doc_hashes, '', *section_names
             )
+            cached_bullets = cache_get(sections_cache_key)
+            
+            if cached_bullets:
+                print(f"   ✓ Reusing cached section summaries")
+                ai_result = {'section_bullets': cached_bullets, 'tokens': 0, 'time': 0}
+            else:
+                ai_result = generate_section_specific_summaries(
+                    documents=processed_documents,
+                    section_names=section_names,
+                    model=openai_model,
+                    max_tokens=max_tokens,
+                    ip_address=ip_address,
+                    
+                    client_int_doc_ids=client_int_doc_ids,
+                    journal_doc_ids=journal_doc_ids,
+                    internal_doc_id=internal_doc_id,
+                    client_id=client_id, cust_id=cust_id, user_id=user_id
+                    
+                )
+                if ai_result['section_bullets']:
+                    cache_set(sections_cache_key, ai_result['section_bullets'])
             
             section_bullets = ai_result['section_bullets']
             
@@ -6,6 +6,14 @@ Converts HTML content to clean, readable text
 from bs4 import BeautifulSoup
 import re
 
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:
+    HTMLParser = None
+
+_WS_RE = re.compile(r'\s+')
+_TAG_RE = re.compile(r'<[^>]+>')
+
 try:
     from save_logs import log_debug
     LOGGING_ENABLED = True
@@ -29,34 +37,42 @@ def html_to_text(html_content):
         return ""
     
     try:
-        # Parse HTML with BeautifulSoup
-        soup = BeautifulSoup(html_content, 'html.parser')
-        
-        # Remove script and style elements
-        for script in soup(["script", "style", "meta", "link"]):
-            script.decompose()
-        
-        # Get text
-        text = soup.get_text(separator=' ')
-        
-        # Clean up whitespace
-        # Remove multiple spaces
-        text = re.sub(r'\s+', ' ', text)
+        text = None
         
-        # Remove leading/trailing whitespace
-        text = text.strip()
+        # Parse HTML with selectolax (C parser) when available
+        if HTMLParser is not None:
+            try:
+                tree = HTMLParser(html_content)
+                
+                # Remove script and style elements
+                for tag in tree.css('script, style, meta, link'):
+                    tag.decompose()
+                
+                # Get text
+                text = tree.text(separator=' ')
+            except Exception as e:
+                log_debug(f"[HTML_CONVERTER] [WARNING] selectolax failed, falling back to BeautifulSoup: {e}")
+                text = None
         
-        # Remove excessive line breaks
-        text = re.sub(r'\n\s*\n', '\n\n', text)
+        if text is None:
+            # Parse HTML with BeautifulSoup
+            soup = BeautifulSoup(html_content, 'html.parser')
+            
+            # Remove script and style elements
+            for script in soup(["script", "style", "meta", "link"]):
+                script.decompose()
+            
+            # Get text
+            text = soup.get_text(separator=' ')
         
-        return text
+        # Collapse all whitespace (including line breaks) in one pass
+        return _WS_RE.sub(' ', text).strip()
         
     except Exception as e:
         log_debug(f"[HTML_CONVERTER] [ERROR] Error converting HTML to text: {e}")
         # Fallback: remove HTML tags with regex
-        text = re.sub(r'<[^>]+>', '', html_content)
-        text = re.sub(r'\s+', ' ', text).strip()
-        return text
+        text = _TAG_RE.sub('', html_content)
+        return _WS_RE.sub(' ', text).strip()
 
 
 def html_to_text_batch(html_list):
@@ -73,21 +89,23 @@ def html_to_text_batch(html_list):
     return [html_to_text(html) for html in html_list]
 
 
-def get_text_summary_info(text):
+def get_text_summary_info(text, word_count=None):
     """
     Get basic information about converted text
     
     Args:
         text (str): Text content
+        word_count (int): Word count if the caller already has it (skips re-splitting the text)
         
     Returns:
         dict: Information about the text (word count, char count, etc.)
     """
-    words = text.split()
+    if word_count is None:
+        word_count = len(text.split())
     info = {
         'character_count': len(text),
-        'word_count': len(words),
-        'estimated_tokens': int(len(words) * 1.3),  # Rough estimate: 1 word = 1.3 tokens
+        'word_count': word_count,
+        'estimated_tokens': int(word_count * 1.3),  # Rough estimate: 1 word = 1.3 tokens
         'preview': text[:200] + '...' if len(text) > 200 else text
     }
     
@@ -2,13 +2,25 @@
 import pyodbc
 import os
 import pyodbc
+import queue
+import atexit
+import threading
+import time
 from datetime import datetime
+from functools import lru_cache
 		
 
+# Driver-level ODBC pooling (must be set before the first connect)
+pyodbc.pooling = True
 
+# Idle connections kept open for reuse by get_db_connection(), as (conn, released_at)
+_POOL = queue.Queue(maxsize=8)
+# Connections idle longer than this (seconds) are checked with SELECT 1 before reuse
+POOL_VALIDATE_AFTER_IDLE = 30
 
-def get_db_connection():
-    """Create and return a database connection using hardcoded credentials."""
+
+def _open_db_connection():
+    """Create and return a new database connection using hardcoded credentials."""
     # For Live
     # driver = "ODBC Driver 17 for SQL Server"
     # server = "SRV298\\MSSQLSERVER2022"
@@ -35,7 +47,58 @@ def get_db_connection():
     )
     return conn
 
-def model_pricing(model_name: str):
+
+def _is_alive(conn):
+    """Round-trip a trivial query; False if the server dropped the connection."""
+    try:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT 1").fetchone()
+        finally:
+            cursor.close()
+        return True
+    except Exception:
+        return False
+
+
+def get_db_connection():
+    """Return a live idle pooled connection, or open a new one if none is left.
+    In the long-running WSGI process the server may close a connection (timeout,
+    restart, failover) while it sits idle, so connections idle for more than
+    POOL_VALIDATE_AFTER_IDLE seconds are checked first; recently used ones are not."""
+    while True:
+        try:
+            conn, released_at = _POOL.get_nowait()
+        except queue.Empty:
+            return _open_db_connection()
+        if time.monotonic() - released_at <= POOL_VALIDATE_AFTER_IDLE or _is_alive(conn):
+            return conn
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def release_db_connection(conn):
+    """Give a connection back to the pool; broken or surplus connections are closed."""
+    if conn is None:
+        return
+    try:
+        # Discard any uncommitted work so the next borrower starts clean
+        conn.rollback()
+        _POOL.put_nowait((conn, time.monotonic()))
+    except Exception:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+@lru_cache(maxsize=32)
+def _fetch_model_pricing(model_name):
+	"""Read (input, output) cost per 1M tokens from tblAiModels; raises if missing.
+	Failures are not cached, so a missing/unreachable model is retried next call."""
+	conn = None
 	try:
 		conn = get_db_connection()
 		cursor = conn.cursor()
@@ -53,73 +116,187 @@ def model_pricing(model_name: str):
 			raise ValueError(f"[ERROR] Model '{model_name}' not found in tblAiModels")
 
 		cursor.close()
-		conn.close()
+
+		return (float(input_cost_per_m or 0), float(output_cost_per_m or 0))
+
+	finally:
+		release_db_connection(conn)
+
+
+def model_pricing(model_name: str):
+	try:
+		input_cost_per_m, output_cost_per_m = _fetch_model_pricing(model_name)
 
 		return {
-			"inputCostPerM": float(input_cost_per_m or 0),
-			"outputCostPerM": float(output_cost_per_m or 0)
+			"inputCostPerM": input_cost_per_m,
+			"outputCostPerM": output_cost_per_m
 		}
 
 	except Exception as e: 
 		return {"inputCostPerM": 0.0, "outputCostPerM": 0.0}
+
+
+def clear_model_pricing_cache():
+	"""Forget cached tblAiModels prices (call after pricing rows are updated)."""
+	_fetch_model_pricing.cache_clear()
 	
 
-def log_to_database(log_data):
+_LOG_INSERT_SQL = """
+INSERT INTO tblAiLogs (
+    intCid,
+    intUserId,
+    intClientId,
+    intDocCount,
+    intPromptToken,
+    intOutputToken,
+    intTotalToken,
+    chrModelName,
+    intAPICalls,
+    InputCost,
+    OutputCost,
+    TotalCost,
+    IPAddress,
+    ProcessingTime,
+    dtCreatedDate,
+    chrClientIntDocIds,
+    chrJournalDocIds,
+    intInternalDocId,
+    chrReportType
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# tblAiLogs columns in _LOG_INSERT_SQL order: (log_data key, default); None marks dtCreatedDate
+_LOG_FIELDS = (
+    ('cid', 0),
+    ('user_id', 0),
+    ('client_id', 0),
+    ('document_count', 0),
+    ('prompt_tokens', 0),
+    ('completion_tokens', 0),
+    ('total_tokens', 0),
+    ('model', ''),
+    ('api_calls', 0),
+    ('input_cost', 0.0),
+    ('output_cost', 0.0),
+    ('total_cost', 0.0),
+    ('ip_address', ''),
+    ('processing_time', 0.0),
+    None,
+    ('chrClientIntDocIds', ''),
+    ('chrJournalDocIds', ''),
+    ('intInternalDocId', None),   # FIXED
+    ('chrReportType', ''),
+)
+
+
+def _write_log_rows(rows):
+    """Insert a batch of tblAiLogs rows in one round-trip."""
+    conn = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-
-        sql = """
-        INSERT INTO tblAiLogs (
-            intCid,
-            intUserId,
-            intClientId,
-            intDocCount,
-            intPromptToken,
-            intOutputToken,
-            intTotalToken,
-            chrModelName,
-            intAPICalls,
-            InputCost,
-            OutputCost,
-            TotalCost,
-            IPAddress,
-            ProcessingTime,
-            dtCreatedDate,
-            chrClientIntDocIds,
-            chrJournalDocIds,
-            intInternalDocId,
-            chrReportType
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """
-
-        values = (
-            log_data.get('cid', 0),
-            log_data.get('user_id', 0),
-            log_data.get('client_id', 0),
-            log_data.get('document_count', 0),
-            log_data.get('prompt_tokens', 0),
-            log_data.get('completion_tokens', 0),
-            log_data.get('total_tokens', 0),
-            log_data.get('model', ''),
-            log_data.get('api_calls', 0),
-            log_data.get('input_cost', 0.0),
-            log_data.get('output_cost', 0.0),
-            log_data.get('total_cost', 0.0),
-            log_data.get('ip_address', ''),
-            log_data.get('processing_time', 0.0),
-            datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            log_data.get('chrClientIntDocIds', ''),
-            log_data.get('chrJournalDocIds', ''),
-            log_data.get('intInternalDocId', None),   # FIXED
-            log_data.get('chrReportType', '')
-        )
-
-        cursor.execute(sql, values)
+        cursor.fast_executemany = True
+        cursor.executemany(_LOG_INSERT_SQL, rows)
         conn.commit()
         cursor.close()
-        conn.close()
 
     except Exception as e:
         import traceback
         traceback.print_exc()
+
+    finally:
+        release_db_connection(conn)
+
+
+class LogWriter:
+    """
+    Background tblAiLogs writer: rows are queued by enqueue() and inserted by one
+    thread in batches of up to batch_size rows or flush_interval seconds, through a
+    pooled connection, so callers never wait on the database.
+    """
+
+    _STOP = object()
+
+    def __init__(self, batch_size=100, flush_interval=0.5):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._thread = None
+        self._closed = False
+        self._thread_lock = threading.Lock()
+
+    def enqueue(self, row):
+        """
+        Queue one row (a tuple in _LOG_INSERT_SQL parameter order). After close()
+        the row is written synchronously instead, so late rows are not lost.
+        """
+        with self._thread_lock:
+            if not self._closed:
+                self._ensure_thread()
+                self._queue.put(row)
+                return
+        _write_log_rows([row])
+
+    def _ensure_thread(self):
+        """Start the writer thread on first use (called with _thread_lock held)."""
+        if self._thread is None:
+            thread = threading.Thread(target=self._run, name="db-log-writer", daemon=True)
+            thread.start()
+            self._thread = thread
+
+    def _run(self):
+        """Drain the queue: up to batch_size rows or flush_interval seconds per batch."""
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is self._STOP:
+                break
+
+            rows = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(rows) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stopping = True
+                    break
+                rows.append(item)
+
+            _write_log_rows(rows)
+
+    def close(self, timeout=30):
+        """Write any queued rows and stop the writer thread (later rows are written synchronously)."""
+        with self._thread_lock:
+            self._closed = True
+            thread = self._thread
+            self._thread = None
+            if thread is None:
+                return
+            # Under the lock, so no row can be queued behind the stop marker
+            self._queue.put(self._STOP)
+        thread.join(timeout)
+
+
+_LOG_WRITER = LogWriter()
+
+
+def flush_log_queue(timeout=30):
+    """Write any queued rows and stop the writer thread (registered with atexit)."""
+    _LOG_WRITER.close(timeout)
+
+
+atexit.register(flush_log_queue)
+
+
+def log_to_database(log_data):
+    """Queue one tblAiLogs row; it is inserted by the background writer."""
+    created = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    _LOG_WRITER.enqueue(tuple(
+        created if field is None else log_data.get(*field)
+        for field in _LOG_FIELDS
+    ))
@@ -5,9 +5,58 @@ Extracts text from Microsoft Word documents (.docx, .doc)
 """
 
 from docx import Document
+from docx.oxml.ns import qn
+from docx.table import Table
+from docx.text.paragraph import Paragraph
 import requests
-from io import BytesIO
 import os
+import tempfile
+from extractors.http_session import stream_to_file
+
+
+# Downloads larger than this are spooled to a temp file instead of kept in memory
+DOCX_SPOOL_MAX_SIZE = 4 * 1024 * 1024
+
+_P_TAG = qn('w:p')
+_TBL_TAG = qn('w:tbl')
+
+
+def _document_text(doc):
+    """
+    Collect paragraph and table text from an opened python-docx Document
+    
+    Args:
+        doc (Document): Opened document
+        
+    Returns:
+        str: Paragraph lines followed by table rows (cells space-separated),
+             or "" when the document has no paragraph text and no tables
+    """
+    # Append to a list and join once; repeated str += copies the buffer every time
+    paragraph_parts = []
+    table_parts = []
+    has_text = False
+    
+    # One walk over the body's top-level elements (doc.paragraphs and doc.tables each walk it again)
+    for child in doc.element.body.iterchildren(_P_TAG, _TBL_TAG):
+        if child.tag == _P_TAG:
+            text = Paragraph(child, doc).text
+            if text and not has_text and not text.isspace():
+                has_text = True
+            paragraph_parts.append(text)
+            paragraph_parts.append("\n")
+        else:
+            for row in Table(child, doc).rows:
+                for cell in row.cells:
+                    table_parts.append(cell.text)
+                    table_parts.append(" ")
+                table_parts.append("\n")
+    
+    # Empty document: nothing worth joining
+    if not has_text and not table_parts:
+        return ""
+    
+    return "".join(paragraph_parts) + "".join(table_parts)
 
 
 def extract_text_from_docx_file(file_path):
@@ -27,25 +76,12 @@ def extract_text_from_docx_file(file_path):
         
         doc = Document(file_path)
         
-        text = ""
-        
-        # Extract text from paragraphs
+        text = _document_text(doc).strip()
         
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
-        
-        # Extract text from tables
-        
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    text += cell.text + " "
-                text += "\n"
-        
-        if len(text.strip()) < 10:
+        if len(text) < 10:
             return False, "", "DOCX appears to be empty or contains no text"
         
-        return True, text.strip(), None
+        return True, text, None
         
     except Exception as e:
         return False, "", f"Error extracting DOCX: {str(e)}"
@@ -62,31 +98,19 @@ def extract_text_from_docx_url(url):
         tuple: (success: bool, text: str, error: str)
     """
     try:
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-        
-        # Open DOCX from bytes
-        docx_file = BytesIO(response.content)
-        doc = Document(docx_file)
-        
-        text = ""
+        # Stream into a spooled buffer: small files stay in RAM, large ones spill to disk
+        with tempfile.SpooledTemporaryFile(max_size=DOCX_SPOOL_MAX_SIZE) as docx_file:
+            stream_to_file(url, docx_file, timeout=30)
+            docx_file.seek(0)
+            
+            doc = Document(docx_file)
         
-        # Extract text from paragraphs
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
-        
-        # Extract text from tables
-
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    text += cell.text + " "
-                text += "\n"
+        text = _document_text(doc).strip()
         
-        if len(text.strip()) < 10:
+        if len(text) < 10:
             return False, "", "DOCX appears to be empty or contains no text"
         
-        return True, text.strip(), None
+        return True, text, None
         
     except requests.exceptions.RequestException as e:
         return False, "", f"Error downloading DOCX: {str(e)}"
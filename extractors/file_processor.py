@@ -5,19 +5,202 @@ Routes files to appropriate extractors based on file type
 """
 
 import os
-from extractors.pdf_extractor import extract_text_from_pdf
+import asyncio
+import hashlib
+import mmap
+import tempfile
+import threading
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from extractors.pdf_extractor import (
+    extract_text_from_pdf, extract_text_from_pdf_hybrid, has_hybrid_pdf_extractor, looks_scanned_pdf
+)
 from extractors.image_extractor import extract_text_from_image
 from extractors.docx_extractor import extract_text_from_docx, extract_text_from_doc
 from extractors.scanned_pdf_extractor import extract_text_from_scanned_pdf
+from extractors.ocr_engine import warm_up as warm_up_ocr
 
 from save_logs import log_debug
+from utils.content_cache import content_hash, cache_get, cache_set
+from extractors.http_session import DOWNLOAD_CHUNK_SIZE
 
+import httpx
 
+
+# PDF parsing and OCR are CPU-bound and hold the GIL; these run in worker processes
+CPU_BOUND_EXTENSIONS = ('.pdf', '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff')
+MAX_EXTRACTION_PROCESSES = min(4, os.cpu_count() or 1)
+# Files extracted / downloaded concurrently by process_multiple_files
+MAX_FILE_THREADS = 8
+MAX_CONCURRENT_DOWNLOADS = 8
+
+# Long-lived threads that run one request's document jobs (see get_scheduler). File jobs
+# mostly wait on the process pool, so there are threads to spare for HTML conversion.
+MAX_SCHEDULER_THREADS = 2 * MAX_EXTRACTION_PROCESSES
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+# Bump when extractor output changes so stale cached extractions are ignored
+EXTRACTION_CACHE_VERSION = 1
+
+
+@lru_cache(maxsize=1024)
 def get_file_extension(filename):
     """Get file extension in lowercase"""
     return os.path.splitext(filename)[1].lower()
 
 
+def _full_path(filename, base_path):
+    """Join base_path and filename the same way the extractors do"""
+    if base_path:
+        if base_path.endswith('/') or base_path.endswith('\\'):
+            return base_path + filename
+        return os.path.join(base_path, filename)
+    return filename
+
+
+def _extraction_cache_key(filename, base_path, ocr_language, try_ocr_if_empty):
+    """
+    Cache key for a file's extraction result, or None if the source can't be fingerprinted
+    
+    Local files are keyed by a SHA-256 of their bytes (hashed straight from a
+    read-only memory map, so no chunk copies are made). URLs are not cached:
+    fingerprinting them would cost an extra HEAD request per file.
+    """
+    full_path = _full_path(filename, base_path)
+    
+    if full_path.startswith('http://') or full_path.startswith('https://'):
+        return None
+    
+    try:
+        with open(full_path, 'rb') as source:
+            if os.fstat(source.fileno()).st_size == 0:
+                # Zero-length files cannot be mapped
+                fingerprint = hashlib.sha256().hexdigest()
+            else:
+                with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    fingerprint = hashlib.sha256(mapped).hexdigest()
+    except (OSError, ValueError):
+        return None
+    
+    return content_hash('extract', EXTRACTION_CACHE_VERSION, get_file_extension(filename),
+                        fingerprint, ocr_language, try_ocr_if_empty)
+
+
+def _init_extraction_worker():
+    """Runs first in each extraction process, before any OCR library is loaded"""
+    # One OpenMP thread per Tesseract call; see extractors/ocr_engine.py
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+    # The pool's processes OCR side by side, so each gets a share of the cores for its page threads
+    os.environ["OCR_THREADS_PER_PROCESS"] = str(max(1, (os.cpu_count() or 1) // MAX_EXTRACTION_PROCESSES))
+
+
+def get_process_pool():
+    """Return the shared extraction process pool, creating it on first use"""
+    global _process_pool
+    if _process_pool is None:
+        with _process_pool_lock:
+            if _process_pool is None:
+                _process_pool = ProcessPoolExecutor(
+                    max_workers=MAX_EXTRACTION_PROCESSES,
+                    initializer=_init_extraction_worker
+                )
+    return _process_pool
+
+
+def warm_up_process_pool(ocr_language='swe', workers=MAX_EXTRACTION_PROCESSES):
+    """
+    Start extraction processes and load the OCR model in each, without waiting
+    
+    Worker start-up (interpreter, extractor imports, language model) then overlaps
+    with whatever the caller does next; real jobs queue behind the warm-up calls.
+    """
+    pool = get_process_pool()
+    for _ in range(min(workers, MAX_EXTRACTION_PROCESSES)):
+        pool.submit(warm_up_ocr, ocr_language)
+
+
+def get_scheduler():
+    """
+    Return the shared file-extraction thread pool, creating it on first use
+    
+    Its threads outlive a single request, so callers submit jobs instead of
+    building (and tearing down) a ThreadPoolExecutor per request. Jobs should
+    call process_file_in_pool: the threads only dispatch, and PDF/image work
+    runs in the process pool.
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = ThreadPoolExecutor(max_workers=MAX_SCHEDULER_THREADS)
+    return _scheduler
+
+
+def _worth_ocr(filename, base_path):
+    """Structural scanned-PDF probe for local files (URLs are not downloaded twice just to probe)"""
+    full_path = _full_path(filename, base_path)
+    if full_path.startswith('http://') or full_path.startswith('https://'):
+        return True
+    try:
+        if looks_scanned_pdf(full_path):
+            return True
+    except Exception as e:
+        log_debug(f"  [WARNING] Scanned-PDF probe failed ({e}), trying OCR anyway")
+        return True
+    log_debug(f"  [INFO] PDF has no page images to OCR, skipping OCR")
+    return False
+
+
+def _extract_pdf(filename, base_path, ocr_language, try_ocr_if_empty):
+    """PDF: single-pass hybrid extractor, or text extraction with whole-document OCR fallback"""
+    if has_hybrid_pdf_extractor():
+        # One pass: text pages read directly, scanned pages OCR'd individually (if allowed)
+        return extract_text_from_pdf_hybrid(filename, base_path, ocr_language, try_ocr_if_empty)
+    
+    success, text, error = extract_text_from_pdf(filename, base_path)
+    
+    # If PDF has no text and try_ocr_if_empty is True, try OCR
+    if not success and try_ocr_if_empty and "scanned" in str(error).lower() \
+            and _worth_ocr(filename, base_path):
+        log_debug(f"  [WARNING] PDF appears to be scanned, trying OCR...path--->{base_path}/{filename}")
+        success, text, error = extract_text_from_scanned_pdf(filename, base_path, ocr_language)
+        return success, text, error, 'pdf_ocr'
+    
+    return success, text, error, 'pdf_text'
+
+
+def _extract_image(filename, base_path, ocr_language, try_ocr_if_empty):
+    return (*extract_text_from_image(filename, base_path, ocr_language), 'image_ocr')
+
+
+def _extract_docx(filename, base_path, ocr_language, try_ocr_if_empty):
+    return (*extract_text_from_docx(filename, base_path), 'docx_text')
+
+
+def _extract_doc(filename, base_path, ocr_language, try_ocr_if_empty):
+    return (*extract_text_from_doc(filename, base_path), 'doc_text')
+
+
+# Extension -> extractor. Every extractor takes (filename, base_path, ocr_language,
+# try_ocr_if_empty) and returns (success, text, error, extraction_method).
+EXTRACTORS = {
+    '.pdf': _extract_pdf,
+    '.png': _extract_image,
+    '.jpg': _extract_image,
+    '.jpeg': _extract_image,
+    '.gif': _extract_image,
+    '.bmp': _extract_image,
+    '.tiff': _extract_image,
+    '.docx': _extract_docx,
+    '.doc': _extract_doc,
+}
+
+
 def process_file(filename, base_path="", ocr_language='swe', try_ocr_if_empty=True):
     """
     Process any file and extract text
@@ -50,61 +233,39 @@ def process_file(filename, base_path="", ocr_language='swe', try_ocr_if_empty=Tr
     ext = get_file_extension(filename)
     result['file_type'] = ext
 
+    # Same file content extracted before -> reuse it (only successes are cached)
+    cache_key = None
+    if ext in EXTRACTORS:
+        cache_key = _extraction_cache_key(filename, base_path, ocr_language, try_ocr_if_empty)
+    if cache_key:
+        cached = cache_get(cache_key)
+        if cached:
+            log_debug(f"  [CACHE] Reusing extracted text for {filename}")
+            return cached
     
     try:
         # Route to appropriate extractor
-        
-        # PDF files
-        if ext == '.pdf':
-            result['extraction_method'] = 'pdf_text'
-            success, text, error = extract_text_from_pdf(filename, base_path)
-            
-            # If PDF has no text and try_ocr_if_empty is True, try OCR
-            if not success and try_ocr_if_empty and "scanned" in str(error).lower():
-                log_debug(f"  [WARNING] PDF appears to be scanned, trying OCR...path--->{base_path}/{filename}")
-                result['extraction_method'] = 'pdf_ocr'
-                success, text, error = extract_text_from_scanned_pdf(filename, base_path, ocr_language)
-            
-            result['success'] = success
-            result['text'] = text
-            result['error'] = error
-        
-        # Image files
-        elif ext in ['.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff']:
-            result['extraction_method'] = 'image_ocr'
-            success, text, error = extract_text_from_image(filename, base_path, ocr_language)
-            result['success'] = success
-            result['text'] = text
-            result['error'] = error
-        
-        # DOCX files
-        elif ext == '.docx':
-            result['extraction_method'] = 'docx_text'
-            success, text, error = extract_text_from_docx(filename, base_path)
-            result['success'] = success
-            result['text'] = text
-            result['error'] = error
-        
-        # Old DOC files
-        elif ext == '.doc':
-            result['extraction_method'] = 'doc_text'
-            success, text, error = extract_text_from_doc(filename, base_path)
+        extractor = EXTRACTORS.get(ext)
+        if extractor is None:
+            result['error'] = f"Unsupported file type: {ext}"
+            # print(f"  [ERROR] Unsupported file type: {ext}")
+        else:
+            success, text, error, method = extractor(filename, base_path, ocr_language, try_ocr_if_empty)
             result['success'] = success
             result['text'] = text
             result['error'] = error
-        
-        # Unsupported file type
-        else:
-            result['error'] = f"Unsupported file type: {ext}"
-            # print(f"  [ERROR] Unsupported file type: {ext}")
+            result['extraction_method'] = method
         
         # Print result
         if result['success']:
             char_count = len(result['text'])
             word_count = len(result['text'].split())
+            result['word_count'] = word_count
             log_debug(f"  [SUCCESS] Extraction completed!")
             log_debug(f"  Method: {result['extraction_method']}")
             log_debug(f"  Extracted: {char_count} characters, {word_count} words")
+            if cache_key:
+                cache_set(cache_key, result)
         else:
             # pass
             log_debug(f"  [FAILED] {result['error']}")
@@ -117,9 +278,109 @@ def process_file(filename, base_path="", ocr_language='swe', try_ocr_if_empty=Tr
     return result
 
 
+def process_file_in_pool(filename, base_path="", ocr_language='swe', try_ocr_if_empty=True):
+    """
+    Same as process_file, but CPU-bound types (PDF, images) run in the shared
+    process pool so several can be parsed/OCR'd in parallel. Other types
+    (DOCX, DOC) are mostly I/O and run in the calling thread.
+    Safe to call from many threads at once; blocks until the result is ready.
+    """
+    if get_file_extension(filename) not in CPU_BOUND_EXTENSIONS:
+        return process_file(filename, base_path, ocr_language, try_ocr_if_empty)
+    
+    try:
+        future = get_process_pool().submit(process_file, filename, base_path, ocr_language, try_ocr_if_empty)
+        return future.result()
+    except BrokenProcessPool as e:
+        # A worker died (e.g. killed by the host); fall back to in-process extraction
+        log_debug(f"  [WARNING] Extraction process pool unavailable ({e}), extracting in-process")
+        return process_file(filename, base_path, ocr_language, try_ocr_if_empty)
+
+
+async def _download_to_temp_file_async(client, url, suffix):
+    """Stream url to a named temp file without blocking the event loop; returns its path"""
+    fd, tmp_path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            async with client.stream('GET', url) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                    tmp_file.write(chunk)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path
+
+
+async def _process_file_async(client, download_slots, executor, filename, base_path, ocr_language):
+    """Download (if remote) then extract one file; extraction runs off the event loop"""
+    loop = asyncio.get_running_loop()
+    full_path = _full_path(filename, base_path)
+    
+    if not (full_path.startswith('http://') or full_path.startswith('https://')):
+        return await loop.run_in_executor(executor, process_file_in_pool, filename, base_path, ocr_language)
+    
+    ext = get_file_extension(filename)
+    try:
+        async with download_slots:
+            tmp_path = await _download_to_temp_file_async(client, full_path, ext)
+    except (httpx.HTTPError, OSError) as e:
+        log_debug(f"  [ERROR] Download failed for {filename}: {e}")
+        return {
+            'success': False,
+            'text': '',
+            'error': f"Error downloading file: {str(e)}",
+            'file_type': ext,
+            'extraction_method': 'none'
+        }
+    
+    # The slot is free again, so the next download overlaps with this extraction
+    try:
+        return await loop.run_in_executor(executor, process_file_in_pool, tmp_path, "", ocr_language)
+    finally:
+        os.remove(tmp_path)
+
+
+async def process_multiple_files_async(files_list, base_path="", ocr_language='swe'):
+    """
+    Process multiple files, downloading remote ones concurrently
+    
+    Downloads (at most MAX_CONCURRENT_DOWNLOADS at a time) overlap with the
+    extraction of files that have already arrived.
+    
+    Args:
+        files_list (list): List of filenames
+        base_path (str): Base path for all files (local folder or URL)
+        ocr_language (str): Language for OCR
+        
+    Returns:
+        list: List of results for each file (same order as files_list)
+    """
+    if not files_list:
+        return []
+    
+    download_slots = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+    limits = httpx.Limits(max_connections=MAX_CONCURRENT_DOWNLOADS)
+    
+    # Threads only dispatch: PDFs/images run in the shared process pool (capped at
+    # MAX_EXTRACTION_PROCESSES, which also bounds OCR memory), DOCX/DOC is mostly I/O
+    with ThreadPoolExecutor(max_workers=min(len(files_list), MAX_FILE_THREADS)) as executor:
+        async with httpx.AsyncClient(timeout=60, follow_redirects=True, limits=limits) as client:
+            results = await asyncio.gather(*[
+                _process_file_async(client, download_slots, executor, filename, base_path, ocr_language)
+                for filename in files_list
+            ])
+    
+    # gather() keeps input order, so results pair up with files_list
+    for filename, result in zip(files_list, results):
+        result['filename'] = filename
+    
+    return list(results)
+
+
 def process_multiple_files(files_list, base_path="", ocr_language='swe'):
     """
-    Process multiple files
+    Process multiple files (sync wrapper around process_multiple_files_async)
     
     Args:
         files_list (list): List of filenames
@@ -129,13 +390,10 @@ def process_multiple_files(files_list, base_path="", ocr_language='swe'):
     Returns:
         list: List of results for each file
     """
-    results = []
-
+    if not files_list:
+        return []
     
-    for i, filename in enumerate(files_list, 1):
-        result = process_file(filename, base_path, ocr_language)
-        result['filename'] = filename
-        results.append(result)
+    results = asyncio.run(process_multiple_files_async(files_list, base_path, ocr_language))
     
     # Summary
     successful = sum(1 for r in results if r['success'])
@@ -0,0 +1,55 @@
+# extractors/http_session.py
+"""
+Shared HTTP session for extractor downloads
+Keeps TCP/TLS connections alive across files and worker threads, and streams
+response bodies to disk so large PDFs are never held in memory as one bytes object.
+"""
+
+import os
+import shutil
+import tempfile
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# Bytes copied per read while streaming a download
+DOWNLOAD_CHUNK_SIZE = 1 << 16
+
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=2))
+SESSION.mount('http://', HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=2))
+
+
+def stream_to_file(url, file_obj, timeout=30):
+    """
+    Download url into an open binary file object without buffering the whole body
+
+    Raises:
+        requests.exceptions.RequestException: On network/HTTP errors
+    """
+    with SESSION.get(url, timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        shutil.copyfileobj(response.raw, file_obj, DOWNLOAD_CHUNK_SIZE)
+
+
+def download_to_temp_file(url, suffix='', timeout=30):
+    """
+    Download url to a named temporary file (caller must delete it)
+
+    Returns:
+        str: Path of the downloaded file
+
+    Raises:
+        requests.exceptions.RequestException: On network/HTTP errors
+    """
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
+        tmp_path = tmp_file.name
+        try:
+            stream_to_file(url, tmp_file, timeout)
+        except BaseException:
+            tmp_file.close()
+            os.remove(tmp_path)
+            raise
+    return tmp_path
@@ -0,0 +1,124 @@
+# extractors/ocr_engine.py
+"""
+OCR Engine
+Single entry point for running Tesseract on a PIL image.
+Uses tesserocr's in-process C API when installed (language model loaded once),
+otherwise falls back to pytesseract (one tesseract process per call).
+"""
+
+import os
+import atexit
+import threading
+
+# Intentionally one OpenMP thread per Tesseract call: pages/files are already OCR'd in
+# parallel, and N workers x 4 OpenMP threads each oversubscribes the CPU and runs far
+# slower than single-threaded calls. Must be set before tesserocr (libtesseract/libgomp)
+# loads; pytesseract's tesseract processes inherit it from the environment.
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+import pytesseract
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+from save_logs import log_debug
+
+
+# Idle tesserocr APIs per language, shared by every thread in this process. An API is
+# used by one thread at a time (they are not thread-safe), then returned here, so the
+# language model is loaded once per concurrent OCR call rather than once per page/thread.
+_idle_apis = {}
+_idle_apis_lock = threading.Lock()
+# Languages the C API could not initialize (handled by pytesseract instead)
+_failed_langs = set()
+
+
+def ocr_thread_count():
+    """
+    Threads one PDF's OCR may use: every core normally, but only this process's share
+    inside the extraction process pool (its initializer sets OCR_THREADS_PER_PROCESS)
+    """
+    return int(os.environ.get('OCR_THREADS_PER_PROCESS', 0)) or os.cpu_count() or 1
+
+
+def has_inprocess_ocr():
+    """True when OCR runs in-process (no per-call tesseract startup to amortize)"""
+    return tesserocr is not None
+
+
+def _acquire_api(lang):
+    """Take an idle PyTessBaseAPI for lang, or create one (None if it cannot be created)"""
+    with _idle_apis_lock:
+        if lang in _failed_langs:
+            return None
+        idle = _idle_apis.get(lang)
+        if idle:
+            return idle.pop()
+
+    kwargs = {'lang': lang, 'oem': tesserocr.OEM.LSTM_ONLY}
+    if os.environ.get('TESSDATA_PREFIX'):
+        kwargs['path'] = os.environ['TESSDATA_PREFIX']
+    try:
+        return tesserocr.PyTessBaseAPI(**kwargs)
+    except Exception as e:
+        # Language data missing for the C API: the CLI may still have it
+        log_debug(f"[OCR] [WARNING] tesserocr init failed for '{lang}' ({e}), using pytesseract")
+        with _idle_apis_lock:
+            _failed_langs.add(lang)
+        return None
+
+
+def _release_api(lang, api):
+    """Return an API to the idle pool for the next caller"""
+    api.Clear()
+    with _idle_apis_lock:
+        _idle_apis.setdefault(lang, []).append(api)
+
+
+def _end_apis():
+    """Free every pooled API (registered with atexit)"""
+    with _idle_apis_lock:
+        apis = [api for idle in _idle_apis.values() for api in idle]
+        _idle_apis.clear()
+    for api in apis:
+        try:
+            api.End()
+        except Exception:
+            pass
+
+
+if tesserocr is not None:
+    atexit.register(_end_apis)
+
+
+def warm_up(lang='swe'):
+    """Load the language model into the idle pool ahead of the first OCR call"""
+    if tesserocr is None:
+        return
+    api = _acquire_api(lang)
+    if api is not None:
+        _release_api(lang, api)
+
+
+def ocr_image(image, lang='swe'):
+    """
+    Run OCR on a PIL image
+
+    Args:
+        image (PIL.Image): Image to read
+        lang (str): OCR language ('swe', 'eng', etc.)
+
+    Returns:
+        str: Recognized text
+    """
+    api = _acquire_api(lang) if tesserocr is not None else None
+    if api is not None:
+        try:
+            api.SetImage(image)
+            return api.GetUTF8Text()
+        finally:
+            _release_api(lang, api)
+
+    return pytesseract.image_to_string(image, lang=lang)
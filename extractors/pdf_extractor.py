@@ -1,6 +1,6 @@
 # extractor/pdf_extractor.py
 """
-PDF Text Extractor using pdfplumber
+PDF Text Extractor using PyMuPDF (falls back to pdfplumber)
 Extracts text from PDF files with excellent table and layout handling
 """
 
@@ -9,11 +9,119 @@ import requests
 from io import BytesIO
 import os
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from extractors.http_session import download_to_temp_file
+from extractors.ocr_engine import ocr_image, ocr_thread_count
+
+try:
+    import pymupdf
+except ImportError:
+    pymupdf = None
+
+# Newer PyMuPDF prints a one-off tip to stdout, which would corrupt the CGI response
+if pymupdf is not None and hasattr(pymupdf, 'no_recommend_layout'):
+    pymupdf.no_recommend_layout()
+
+
+# Only this many pages are read per document
+MAX_PDF_PAGES = 50
+
+# Hybrid extraction: pages with this much text or less that carry an image are treated
+# as scanned and OCR'd (blank/separator pages without images are not rendered)
+MIN_PAGE_TEXT_CHARS = 30
+HYBRID_OCR_DPI = 200
+
+# looks_scanned_pdf(): sampled pages with at least this much text are born-digital
+SCANNED_PROBE_MIN_CHARS = 300
+
+# pdfplumber's default strategies, spelled out: only ruled (line-drawn) tables are detected
+PDFPLUMBER_TABLE_SETTINGS = {"vertical_strategy": "lines", "horizontal_strategy": "lines"}
+
+
+def _clean_cell(cell):
+    """Cell value as stripped text ('' for None/empty cells)"""
+    if not cell:
+        return ''
+    if cell.__class__ is str:
+        return cell.strip()
+    return str(cell).strip()
+
+
+def _format_table(parts, table_num, table):
+    """Append one table as "[Table K]" followed by " | "-joined rows"""
+    parts.append(f"\n[Table {table_num}]\n")
+    # One join for the whole table instead of a string per row
+    parts.append("".join([" | ".join(map(_clean_cell, row)) + "\n" for row in table]))
+    parts.append("\n")
+
+
+def _pymupdf_tables(page):
+    """Tables on a MuPDF page; skipped when the page has no vector graphics to form ruled tables"""
+    # find_tables() costs ~100 ms even on plain narrative pages; get_cdrawings() ~1 ms
+    if not page.get_cdrawings():
+        return []
+    return page.find_tables().tables
+
+
+def _extract_with_pymupdf(file_path):
+    """Page text and tables via MuPDF (C engine), in the same layout as the pdfplumber path"""
+    parts = []
+    
+    with pymupdf.open(file_path) as pdf:
+        for page in pdf.pages(0, min(pdf.page_count, MAX_PDF_PAGES)):
+            # Extract regular text
+            page_text = page.get_text("text").rstrip("\n")
+            if page_text:
+                parts.append(f"\n--- Page {page.number + 1} ---\n")
+                parts.append(page_text + "\n")
+            
+            # Extract tables
+            for table_num, table in enumerate(_pymupdf_tables(page), 1):
+                _format_table(parts, table_num, table.extract())
+    
+    return "".join(parts)
+
+
+def _extract_with_pdfplumber(file_path):
+    """Page text and tables via pdfplumber (pure Python; used when PyMuPDF is unavailable)"""
+    parts = []
+    
+    with pdfplumber.open(file_path) as pdf:
+        # print(f"  PDF has {len(pdf.pages)} pages")
+        
+        # Extract text from all pages (limit to MAX_PDF_PAGES for performance)
+        for page_num, page in enumerate(pdf.pages[:MAX_PDF_PAGES], 1):
+            # Extract regular text
+            page_text = page.extract_text()
+            if page_text:
+                parts.append(f"\n--- Page {page_num} ---\n")
+                parts.append(page_text + "\n")
+            
+            # Extract tables (IMPORTANT for your documents!)
+            # Ruled tables are built from lines/rects/curves; pages without any can't have one
+            if page.lines or page.rects or page.curves:
+                tables = page.extract_tables(table_settings=PDFPLUMBER_TABLE_SETTINGS)
+            else:
+                tables = []
+            if tables:
+                # print(f"    Found {len(tables)} table(s) on page {page_num}")
+                for table_num, table in enumerate(tables, 1):
+                    _format_table(parts, table_num, table)
+    
+    return "".join(parts)
+
+
+def _extract_pdf_text(file_path):
+    """Extract page text and tables with the fastest available engine"""
+    if pymupdf is not None:
+        return _extract_with_pymupdf(file_path)
+    return _extract_with_pdfplumber(file_path)
 
 
 def extract_text_from_pdf_file(file_path):
     """
-    Extract text from a local PDF file using pdfplumber
+    Extract text from a local PDF file (PyMuPDF, or pdfplumber as fallback)
     
     Args:
         file_path (str): Full path to PDF file
@@ -26,33 +134,7 @@ def extract_text_from_pdf_file(file_path):
             return False, "", f"File not found: {file_path}"
         
         
-        text = ""
-        
-        with pdfplumber.open(file_path) as pdf:
-            num_pages = len(pdf.pages)
-            # print(f"  PDF has {num_pages} pages")
-            
-            # Extract text from all pages (limit to 50 pages for performance)
-            for page_num in range(min(num_pages, 50)):
-                page = pdf.pages[page_num]
-                
-                # Extract regular text
-                page_text = page.extract_text()
-                if page_text:
-                    text += f"\n--- Page {page_num + 1} ---\n"
-                    text += page_text + "\n"
-                
-                # Extract tables (IMPORTANT for your documents!)
-                tables = page.extract_tables()
-                if tables:
-                    # print(f"    Found {len(tables)} table(s) on page {page_num + 1}")
-                    for table_num, table in enumerate(tables, 1):
-                        text += f"\n[Table {table_num}]\n"
-                        for row in table:
-                            # Clean and join cells
-                            cleaned_row = [str(cell).strip() if cell else '' for cell in row]
-                            text += " | ".join(cleaned_row) + "\n"
-                        text += "\n"
+        text = _extract_pdf_text(file_path)
         
         # Check if PDF has actual text
         if len(text.strip()) < 50:
@@ -66,7 +148,7 @@ def extract_text_from_pdf_file(file_path):
 
 def extract_text_from_pdf_url(url):
     """
-    Extract text from a PDF file via URL using pdfplumber
+    Extract text from a PDF file via URL (PyMuPDF, or pdfplumber as fallback)
     
     Args:
         url (str): URL to PDF file
@@ -75,41 +157,11 @@ def extract_text_from_pdf_url(url):
         tuple: (success: bool, text: str, error: str)
     """
     try:
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-        
-        # Save to temporary file (pdfplumber works better with file paths)
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            tmp_file.write(response.content)
-            tmp_path = tmp_file.name
+        # Stream to a temporary file (both engines work best with file paths)
+        tmp_path = download_to_temp_file(url, suffix='.pdf', timeout=30)
         
         try:
-            text = ""
-            
-            with pdfplumber.open(tmp_path) as pdf:
-                num_pages = len(pdf.pages)
-                # print(f"  PDF has {num_pages} pages")
-                
-                # Extract text from all pages (limit to 50 pages)
-                for page_num in range(min(num_pages, 50)):
-                    page = pdf.pages[page_num]
-                    
-                    # Extract regular text
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += f"\n--- Page {page_num + 1} ---\n"
-                        text += page_text + "\n"
-                    
-                    # Extract tables
-                    tables = page.extract_tables()
-                    if tables:
-                        # print(f"    Found {len(tables)} table(s) on page {page_num + 1}")
-                        for table_num, table in enumerate(tables, 1):
-                            text += f"\n[Table {table_num}]\n"
-                            for row in table:
-                                cleaned_row = [str(cell).strip() if cell else '' for cell in row]
-                                text += " | ".join(cleaned_row) + "\n"
-                            text += "\n"
+            text = _extract_pdf_text(tmp_path)
             
             # Check if PDF has actual text
             if len(text.strip()) < 50:
@@ -128,10 +180,177 @@ def extract_text_from_pdf_url(url):
         return False, "", f"Error extracting PDF from URL: {str(e)}"
 
 
+def looks_scanned_pdf(file_path):
+    """
+    Cheap structural check before committing to whole-document OCR
+    
+    Samples the first, middle and last pages: a text layer (>= SCANNED_PROBE_MIN_CHARS
+    characters across them) means the PDF is born-digital; otherwise it only counts as
+    scanned if the sampled pages carry images for OCR to read.
+    
+    Returns:
+        bool: True if OCR is worth running
+    """
+    if pymupdf is not None:
+        with pymupdf.open(file_path) as pdf:
+            page_count = pdf.page_count
+            if not page_count:
+                return False
+            probes = [pdf[n] for n in sorted({0, page_count // 2, page_count - 1})]
+            chars = sum(len(page.get_text("text").strip()) for page in probes)
+            has_images = any(page.get_images() for page in probes)
+    else:
+        with pdfplumber.open(file_path) as pdf:
+            page_count = len(pdf.pages)
+            if not page_count:
+                return False
+            probes = [pdf.pages[n] for n in sorted({0, page_count // 2, page_count - 1})]
+            chars = sum(len(page.chars) for page in probes)
+            has_images = any(page.images for page in probes)
+    
+    return chars < SCANNED_PROBE_MIN_CHARS and has_images
+
+
+def has_hybrid_pdf_extractor():
+    """True when extract_text_from_pdf_hybrid can run (PyMuPDF installed)"""
+    return pymupdf is not None
+
+
+def _ocr_pixmap(pixmap, lang):
+    """OCR a grayscale MuPDF pixmap"""
+    # Wrap the pixmap's own pixel buffer (no copy); pixmap stays referenced until OCR ends
+    image = Image.frombuffer(
+        "L", (pixmap.width, pixmap.height), pixmap.samples_mv, "raw", "L", pixmap.stride, 1
+    )
+    try:
+        return ocr_image(image, lang)
+    finally:
+        image.close()
+
+
+def _classify_page(page_text, has_images, try_ocr):
+    """
+    How the hybrid pass handles a page: 'text' (use its text layer), 'ocr' (render
+    and OCR it) or 'skip' (nothing to read)
+    
+    Args:
+        page_text (str): The page's text layer
+        has_images (bool): The page embeds at least one image
+        try_ocr (bool): OCR is allowed for this document
+    """
+    stripped_len = len(page_text.strip())
+    if stripped_len > MIN_PAGE_TEXT_CHARS:
+        return 'text'
+    if try_ocr and has_images:
+        return 'ocr'
+    return 'text' if stripped_len else 'skip'
+
+
+def _extract_hybrid(file_path, lang, try_ocr=True):
+    """
+    One pass over the PDF: text-layer pages are read directly, image pages without a
+    text layer are rendered and OCR'd on their own (only when try_ocr is True)
+    
+    Returns:
+        tuple: (text: str, text_pages: int, ocr_pages: int)
+    """
+    page_blocks = []
+    ocr_futures = {}
+    text_pages = 0
+    
+    workers = ocr_thread_count()
+    with ThreadPoolExecutor(max_workers=workers) as executor, pymupdf.open(file_path) as pdf:
+        for page in pdf.pages(0, min(pdf.page_count, MAX_PDF_PAGES)):
+            page_text = page.get_text("text").rstrip("\n")
+            # get_images() is only consulted for near-empty pages that may be OCR'd
+            has_images = try_ocr and len(page_text.strip()) <= MIN_PAGE_TEXT_CHARS and bool(page.get_images())
+            kind = _classify_page(page_text, has_images, try_ocr)
+            
+            if kind == 'skip':
+                continue
+            if kind == 'text':
+                text_pages += 1
+                parts = [f"\n--- Page {page.number + 1} ---\n", page_text + "\n"]
+                for table_num, table in enumerate(_pymupdf_tables(page), 1):
+                    _format_table(parts, table_num, table.extract())
+                page_blocks.append("".join(parts))
+            else:
+                # Keep at most a few rendered pages waiting for OCR
+                while len(ocr_futures) - sum(f.done() for f in ocr_futures.values()) >= workers * 2:
+                    next(f for f in ocr_futures.values() if not f.done()).result()
+                pixmap = page.get_pixmap(dpi=HYBRID_OCR_DPI, colorspace=pymupdf.csGRAY)
+                ocr_futures[len(page_blocks)] = executor.submit(_ocr_pixmap, pixmap, lang)
+                page_blocks.append(page.number + 1)
+        
+        for index, future in ocr_futures.items():
+            page_number = page_blocks[index]
+            page_blocks[index] = f"\n--- Page {page_number} ---\n{future.result()}\n"
+    
+    return "".join(page_blocks), text_pages, len(ocr_futures)
+
+
+def extract_text_from_pdf_hybrid(pdf_path, base_path="", lang='swe', try_ocr=True):
+    """
+    Extract text from any PDF in a single pass (requires PyMuPDF)
+    Born-digital pages keep their text/tables; scanned pages are OCR'd page by page,
+    so mixed PDFs are neither parsed twice nor fully rasterized.
+    
+    Args:
+        pdf_path (str): PDF filename or relative path
+        base_path (str): Base path (folder path or URL)
+        lang (str): OCR language for scanned pages
+        try_ocr (bool): OCR image pages without a text layer (False: text layer only)
+        
+    Returns:
+        tuple: (success: bool, text: str, error: str, method: str)
+               method is 'pdf_text', 'pdf_ocr' or 'pdf_hybrid'
+    """
+    if base_path:
+        if base_path.endswith('/') or base_path.endswith('\\'):
+            full_path = base_path + pdf_path
+        else:
+            full_path = os.path.join(base_path, pdf_path)
+    else:
+        full_path = pdf_path
+    
+    is_url = full_path.startswith('http://') or full_path.startswith('https://')
+    tmp_path = None
+    try:
+        if is_url:
+            tmp_path = download_to_temp_file(full_path, suffix='.pdf', timeout=60)
+            local_path = tmp_path
+        else:
+            if not os.path.exists(full_path):
+                return False, "", f"File not found: {full_path}", 'pdf_text'
+            local_path = full_path
+        
+        text, text_pages, ocr_pages = _extract_hybrid(local_path, lang, try_ocr)
+        
+        if not ocr_pages:
+            method = 'pdf_text'
+        elif not text_pages:
+            method = 'pdf_ocr'
+        else:
+            method = 'pdf_hybrid'
+        
+        if len(text.strip()) < 50:
+            return False, "", "No text found in PDF (text layer or OCR)", method
+        
+        return True, text.strip(), None, method
+    
+    except requests.exceptions.RequestException as e:
+        return False, "", f"Error downloading PDF: {str(e)}", 'pdf_text'
+    except Exception as e:
+        return False, "", f"Error extracting PDF: {str(e)}", 'pdf_text'
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
 def extract_text_from_pdf(pdf_path, base_path=""):
     """
     Extract text from PDF - handles both local files and URLs
-    Uses pdfplumber for excellent table and layout handling
+    Uses PyMuPDF when installed, otherwise pdfplumber
     
     Args:
         pdf_path (str): PDF filename or relative path
@@ -158,6 +377,23 @@ def extract_text_from_pdf(pdf_path, base_path=""):
         return extract_text_from_pdf_file(full_path)
 
 
+def _pdf_info(file_path, display_path):
+    """Page count of a local PDF in the get_pdf_info() shape"""
+    if pymupdf is not None:
+        with pymupdf.open(file_path) as pdf:
+            num_pages, extractor = pdf.page_count, 'pymupdf'
+    else:
+        with pdfplumber.open(file_path) as pdf:
+            num_pages, extractor = len(pdf.pages), 'pdfplumber'
+    
+    return {
+        'num_pages': num_pages,
+        'has_text': True,
+        'path': display_path,
+        'extractor': extractor
+    }
+
+
 def get_pdf_info(pdf_path, base_path=""):
     """
     Get basic information about PDF
@@ -179,30 +415,15 @@ def get_pdf_info(pdf_path, base_path=""):
     
     try:
         if full_path.startswith('http://') or full_path.startswith('https://'):
-            response = requests.get(full_path, timeout=30)
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-                tmp_file.write(response.content)
-                tmp_path = tmp_file.name
+            tmp_path = download_to_temp_file(full_path, suffix='.pdf', timeout=30)
             
             try:
-                with pdfplumber.open(tmp_path) as pdf:
-                    return {
-                        'num_pages': len(pdf.pages),
-                        'has_text': True,
-                        'path': full_path,
-                        'extractor': 'pdfplumber'
-                    }
+                return _pdf_info(tmp_path, full_path)
             finally:
                 if os.path.exists(tmp_path):
                     os.remove(tmp_path)
         else:
-            with pdfplumber.open(full_path) as pdf:
-                return {
-                    'num_pages': len(pdf.pages),
-                    'has_text': True,
-                    'path': full_path,
-                    'extractor': 'pdfplumber'
-                }
+            return _pdf_info(full_path, full_path)
         
     except Exception as e:
         return {
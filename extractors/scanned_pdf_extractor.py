@@ -11,11 +11,198 @@ import requests
 from io import BytesIO
 import os
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from save_logs import log_debug
+from extractors.ocr_engine import ocr_image, has_inprocess_ocr, ocr_thread_count
+from extractors.http_session import download_to_temp_file
 
 os.environ["PATH"] += os.pathsep + r"C:\poppler\Library\bin"
 os.environ["PATH"] += os.pathsep + r"C:\Program Files\Tesseract-OCR"
 
+# Only this many pages are OCR'd per document
+MAX_OCR_PAGES = 50
+
+# Pages rasterized per pdf2image call; only a few rendered pages are held in memory at once
+RASTER_CHUNK_PAGES = 4
+
+# Adaptive resolution: page 1 is probed at PROBE_DPI to measure text height; pages are
+# rendered at DEFAULT_DPI when text is tall enough there, otherwise at HIGH_DPI
+PROBE_DPI = 100
+DEFAULT_DPI = 200
+HIGH_DPI = 300
+MIN_TEXT_HEIGHT_PX = 20
+MIN_PROBE_CONFIDENCE = 60
+
+# From this many pages on, each worker OCRs a page range in one tesseract run (list-file
+# batch mode), paying the model load once per worker instead of once per page
+BATCH_MIN_PAGES = 10
+
+
+def _ocr_page(image, lang):
+    """OCR one page image, then free its pixels"""
+    try:
+        return ocr_image(image, lang)
+    finally:
+        image.close()
+
+
+def _choose_dpi(pdf_path, lang):
+    """
+    Pick the rasterization DPI from the text height on page 1
+    
+    Tesseract reads body text well once glyphs are ~20 px tall; rendering larger than
+    that only multiplies pixels (cost grows with DPI squared).
+    
+    Returns:
+        int: DEFAULT_DPI, or HIGH_DPI for small text / unreliable probe
+    """
+    try:
+        probe = pdf2image.convert_from_path(
+            pdf_path, dpi=PROBE_DPI, first_page=1, last_page=1, use_pdftocairo=True
+        )[0]
+        try:
+            data = pytesseract.image_to_data(probe, lang=lang, output_type=pytesseract.Output.DICT)
+        finally:
+            probe.close()
+    except Exception as e:
+        log_debug(f"  [WARNING] DPI probe failed ({e}), using {HIGH_DPI} DPI")
+        return HIGH_DPI
+    
+    heights = []
+    confidences = []
+    for text, height, conf in zip(data['text'], data['height'], data['conf']):
+        conf = float(conf)
+        if text.strip() and conf >= 0:
+            heights.append(height)
+            confidences.append(conf)
+    
+    if not heights:
+        return HIGH_DPI
+    
+    heights.sort()
+    median_height = heights[len(heights) // 2]
+    mean_confidence = sum(confidences) / len(confidences)
+    height_at_default = median_height * DEFAULT_DPI / PROBE_DPI
+    
+    dpi = DEFAULT_DPI
+    if height_at_default < MIN_TEXT_HEIGHT_PX or mean_confidence < MIN_PROBE_CONFIDENCE:
+        dpi = HIGH_DPI
+    log_debug(f"  Text height {median_height}px @{PROBE_DPI} DPI, confidence {mean_confidence:.0f} -> {dpi} DPI")
+    return dpi
+
+
+def _ocr_page_range(pdf_path, first_page, last_page, lang, work_dir, dpi):
+    """
+    Rasterize a page range to PNG files and OCR them with a single tesseract run
+    
+    Returns:
+        list: Text of each page in the range
+    """
+    page_paths = pdf2image.convert_from_path(
+        pdf_path,
+        dpi=dpi,
+        first_page=first_page,
+        last_page=last_page,
+        output_folder=work_dir,
+        output_file=f"p{first_page:04d}_",
+        fmt='png',
+        paths_only=True,
+        use_pdftocairo=True
+    )
+    
+    # Tesseract treats a .txt input as a list of images, one path per line
+    list_path = os.path.join(work_dir, f"pages_{first_page:04d}.txt")
+    with open(list_path, 'w', encoding='utf-8') as list_file:
+        list_file.write("\n".join(page_paths) + "\n")
+    
+    output = pytesseract.image_to_string(list_path, lang=lang)
+    
+    # Pages are separated by form feeds; pad in case tesseract skipped one
+    page_texts = output.split("\x0c")[:len(page_paths)]
+    page_texts += [""] * (len(page_paths) - len(page_texts))
+    return page_texts
+
+
+def _ocr_pdf_batched(pdf_path, ocr_pages, workers, lang, dpi):
+    """Split the pages into one contiguous range per worker and OCR each range in batch mode"""
+    pages_per_worker = -(-ocr_pages // workers)
+    ranges = [
+        (first_page, min(first_page + pages_per_worker - 1, ocr_pages))
+        for first_page in range(1, ocr_pages + 1, pages_per_worker)
+    ]
+    
+    with tempfile.TemporaryDirectory() as work_dir:
+        with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            futures = [
+                executor.submit(_ocr_page_range, pdf_path, first_page, last_page, lang, work_dir, dpi)
+                for first_page, last_page in ranges
+            ]
+            return [page_text for future in futures for page_text in future.result()]
+
+
+def _ocr_pdf_streamed(pdf_path, ocr_pages, workers, lang, dpi):
+    """Rasterize a few pages at a time in memory and OCR each page as soon as it is rendered"""
+    # Rasterizing stops once this many rendered pages are still waiting for OCR
+    max_pending = workers + RASTER_CHUNK_PAGES
+    
+    futures = []
+    done = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for first_page in range(1, ocr_pages + 1, RASTER_CHUNK_PAGES):
+            while len(futures) - done >= max_pending:
+                futures[done].result()
+                done += 1
+            
+            last_page = min(first_page + RASTER_CHUNK_PAGES - 1, ocr_pages)
+            images = pdf2image.convert_from_path(
+                pdf_path,
+                dpi=dpi,
+                first_page=first_page,
+                last_page=last_page,
+                thread_count=min(RASTER_CHUNK_PAGES, last_page - first_page + 1),
+                use_pdftocairo=True
+            )
+            for image in images:
+                futures.append(executor.submit(_ocr_page, image, lang))
+            del images
+        
+        return [future.result() for future in futures]
+
+
+def _ocr_pdf(pdf_path, lang):
+    """
+    OCR the first MAX_OCR_PAGES pages of a PDF in parallel
+    
+    Args:
+        pdf_path (str): Local PDF path
+        lang (str): OCR language
+        
+    Returns:
+        str: "--- Page i ---" blocks in page order
+    """
+    page_count = pdf2image.pdfinfo_from_path(pdf_path)['Pages']
+    ocr_pages = min(page_count, MAX_OCR_PAGES)
+    log_debug(f"  PDF has {page_count} pages")
+    if not ocr_pages:
+        return ""
+    
+    dpi = _choose_dpi(pdf_path, lang)
+    
+    # Both engines run outside the GIL (tesseract process / tesserocr C call), so threads scale
+    workers = min(ocr_thread_count(), ocr_pages)
+    log_debug(f"  Running OCR on {ocr_pages} pages at {dpi} DPI with {workers} workers (language: {lang})...")
+    
+    # Batch mode only saves tesseract process startups; the in-process API has none
+    if ocr_pages >= BATCH_MIN_PAGES and not has_inprocess_ocr():
+        page_texts = _ocr_pdf_batched(pdf_path, ocr_pages, workers, lang, dpi)
+    else:
+        page_texts = _ocr_pdf_streamed(pdf_path, ocr_pages, workers, lang, dpi)
+    
+    return "".join(
+        f"\n--- Page {i} ---\n{page_text}\n"
+        for i, page_text in enumerate(page_texts, 1)
+    )
+
 
 def extract_text_from_scanned_pdf_file(file_path, lang='swe'):
     log_debug(f" extract_text_from_scanned_pdf_file  function calling ...")
@@ -34,19 +221,8 @@ def extract_text_from_scanned_pdf_file(file_path, lang='swe'):
             return False, "", f"File not found: {file_path}"
 
         log_debug(f"  Converting PDF pages to images...")
-        # Convert PDF to images
-        images = pdf2image.convert_from_path(file_path, dpi=300)
-
-        log_debug(f"  PDF has {len(images)} pages")
-        log_debug(f"  Running OCR on each page (language: {lang})...")
-        
-        
-        text = ""
-        # Perform OCR on each page
-        for i, image in enumerate(images[:50], 1):  # Limit to 50 pages
-            log_debug(f"    Processing page {i}/{min(len(images), 50)}...")
-            page_text = pytesseract.image_to_string(image, lang=lang)
-            text += f"\n--- Page {i} ---\n{page_text}\n"
+        # Convert PDF pages to images chunk by chunk and OCR each page
+        text = _ocr_pdf(file_path, lang)
         
         if len(text.strip()) < 50:
             return False, "", "No text detected in scanned PDF"
@@ -71,28 +247,13 @@ def extract_text_from_scanned_pdf_url(url, lang='swe'):
     """
     try:
         log_debug(f"  Downloading PDF from URL...")
-        response = requests.get(url, timeout=60)
-        response.raise_for_status()
-        
-        # Save to temporary file (pdf2image requires a file path)
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            tmp_file.write(response.content)
-            tmp_path = tmp_file.name
+        # Stream to a temporary file (pdf2image requires a file path)
+        tmp_path = download_to_temp_file(url, suffix='.pdf', timeout=60)
         
         try:
             log_debug(f"  Converting PDF pages to images...")
-            # Convert PDF to images
-            images = pdf2image.convert_from_path(tmp_path, dpi=300)
-            
-            log_debug(f"  PDF has {len(images)} pages")
-            log_debug(f"  Running OCR on each page (language: {lang})...")
-            
-            text = ""
-            # Perform OCR on each page
-            for i, image in enumerate(images[:50], 1):  # Limit to 50 pages
-                log_debug(f"    Processing page {i}/{min(len(images), 50)}...")
-                page_text = pytesseract.image_to_string(image, lang=lang)
-                text += f"\n--- Page {i} ---\n{page_text}\n"
+            # Convert PDF pages to images chunk by chunk and OCR each page
+            text = _ocr_pdf(tmp_path, lang)
             
             if len(text.strip()) < 50:
                 return False, "", "No text detected in scanned PDF"
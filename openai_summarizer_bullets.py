@@ -5,30 +5,561 @@ Generates organized summaries with AI-generated section headers
 Used when NO template is provided
 """
 
-from openai import OpenAI
+import httpx
+import openai
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletion
+from openai.types import CompletionUsage
 import os
+import io
 import json
+import random
+import re
 import time
+import asyncio
+import threading
 from db_model import model_pricing, log_to_database
 from utils.config import Config
+from utils.content_cache import content_hash, cache_get, cache_set
+from utils.compress import compress_doc_text, truncate_to_tokens, count_tokens
 
 conf = Config()
 
 try:
-    from save_logs import log_debug
+    import h2  # Enables HTTP/2 in httpx
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+try:
+    from save_logs import log_debug, log_exception
     LOGGING_ENABLED = True
 except:
     LOGGING_ENABLED = False
     def log_debug(msg):
         pass
+    def log_exception(msg):
+        pass
+
+# Maximum shard requests in flight at once
+MAX_CONCURRENT_SHARDS = 4
+
+# Input tokens allowed per document (text beyond this is cut off)
+TOKEN_BUDGET_PER_DOC = 2000
+# Characters kept before tokenizing, so huge documents are not encoded in full
+PRE_TOKENIZE_MAX_CHARS = TOKEN_BUDGET_PER_DOC * 8
+
+# Fallback prices (USD per 1M tokens) for models without a tblAiModels row
+DEFAULT_PRICING = {
+    'gpt-4o-mini': {"inputCostPerM": 0.15, "outputCostPerM": 0.60}
+}
+
+# Account rate limits the shard calls are paced against (shared by all calls in a process)
+TPM_LIMIT = getattr(conf, 'OPENAI_TPM_LIMIT', 200_000)
+RPM_LIMIT = getattr(conf, 'OPENAI_RPM_LIMIT', 500)
+
+# Connection pool for the API client: sized well above MAX_CONCURRENT_SHARDS so
+# concurrent shard calls never queue inside httpx
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=30)
+HTTP_TIMEOUT = httpx.Timeout(120.0, connect=10.0)
+
+# Shard calls: attempts on transient failures (429, 5xx, connection errors) and the
+# bounds of the randomized exponential backoff between them (seconds)
+API_MAX_ATTEMPTS = 6
+RETRY_MIN_WAIT = 1
+RETRY_MAX_WAIT = 60
+_RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+# Batch API: token price multiplier and status polling interval bounds (seconds)
+BATCH_PRICE_FACTOR = 0.5
+BATCH_POLL_INITIAL = 1
+BATCH_POLL_MAX = 60
+
+# Bump when the prompt or response format changes so cached responses are not reused
+PROMPT_VERSION = 2
+# Cached shard responses older than this (seconds) are regenerated. Responses live in the
+# in-process LRU of utils.content_cache; sharing them between processes needs the explicit
+# Config.CONTENT_CACHE_BACKEND = 'disk' + CONTENT_CACHE_DIR opt-in (see that module).
+# The lifetime is also capped by Config.CONTENT_CACHE_TTL.
+LLM_CACHE_TTL = getattr(conf, 'LLM_CACHE_TTL', 24 * 3600)
+
+# Usage reported for shards answered from the cache (no tokens spent)
+_NO_USAGE = CompletionUsage(prompt_tokens=0, completion_tokens=0, total_tokens=0)
+
+
+LANGUAGE = 'svenska'
+
+# Static instructions, identical for every shard call: sent as the system message so the
+# user message carries only the documents (and the shared prefix can be prompt-cached)
+SYSTEM_PROMPT = f"""You are an expert at analyzing diverse documents and creating well-organized summaries with appropriate section headers in {LANGUAGE}. You identify key themes and organize information logically.
+
+TASK:
+Analyze ALL documents and create an organized summary with appropriate section headers based on the actual content.
+
+INSTRUCTIONS:
+1. Identify the 4-8 most important themes/topics actually found across ALL documents
+2. Create a descriptive Swedish section header for each theme (e.g., "HÄLSA OCH VÅRD", "UTBILDNING", "BETEENDE OCH UTVECKLING", "SOCIALA RELATIONER")
+3. Under each header, provide 3-8 bullet points (15-40 words each)
+4. Include specific dates, names, facts, and important details
+5. Highlight dates by wrapping them: {{{{HIGHLIGHT}}}}date{{{{/HIGHLIGHT}}}}
+6. Combine related information from multiple documents; include ALL important information
+7. Use professional {LANGUAGE}; section headers in ALL CAPS and descriptive
+8. Do not create empty or generic sections"""
+
+# Reduce step for multi-shard runs: combines the per-shard section lists
+MERGE_SYSTEM_PROMPT = f"""You merge section lists produced from separate parts of the same set of documents into one organized summary report in {LANGUAGE}.
+
+INSTRUCTIONS:
+1. Combine sections that cover the same theme under one descriptive ALL CAPS header (4-8 sections in total)
+2. Remove duplicate or overlapping bullets, merging their details into one bullet
+3. Keep every distinct fact, date and name; do not invent information
+4. Keep {{{{HIGHLIGHT}}}}...{{{{/HIGHLIGHT}}}} markers exactly as they are
+5. Each section should have 3-8 substantive bullet points in professional {LANGUAGE}"""
+
+# Structured outputs: the model is constrained to this shape at decode time
+SECTIONS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "sections": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "header": {"type": "string"},
+                    "bullets": {"type": "array", "items": {"type": "string"}}
+                },
+                "required": ["header", "bullets"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["sections"],
+    "additionalProperties": False
+}
+
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "organized_summary", "strict": True, "schema": SECTIONS_SCHEMA}
+}
+
+
+# Prebuilt message pieces: every call sends byte-identical system messages, so the
+# API's prompt prefix cache can match them
+_SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+_MERGE_SYSTEM_MESSAGE = {"role": "system", "content": MERGE_SYSTEM_PROMPT}
+_USER_PREFIX = "DOCUMENTS:\n"
+_USER_SUFFIX = "\n\nProduce the JSON as specified."
+_DOC_SEPARATOR = f"\n{'=' * 60}\n"
+_DOC_SEPARATOR_END = f"{'=' * 60}\n"
+
+
+def _build_prompt(shard, start_idx, model):
+    """Build the user prompt for one shard of documents (numbered from start_idx)"""
+    # Build document context
+    parts = [_USER_PREFIX]
+    for idx, doc in enumerate(shard, start_idx):
+        doc_name = doc.get('name', f'Document {idx}')
+        # Limit per doc to stay within token limits
+        doc_text = truncate_to_tokens(
+            compress_doc_text(doc.get('text', ''), max_chars=PRE_TOKENIZE_MAX_CHARS),
+            TOKEN_BUDGET_PER_DOC, model
+        )
+        word_count = doc.get('text_info', {}).get('word_count', 0)
+        created_date = doc.get('created_date', 'Unknown date')
+        
+        parts.append(_DOC_SEPARATOR)
+        parts.append(f"Document {idx}: {doc_name}\n")
+        parts.append(f"Date: {created_date} | Words: {word_count}\n")
+        parts.append(_DOC_SEPARATOR_END)
+        parts.append(f"{doc_text}\n\n")
+    
+    parts.append(_USER_SUFFIX)
+    return "".join(parts)
+
+
+def _build_request(shard, start_idx, model, max_tokens):
+    """Build the chat.completions request body for one shard of documents"""
+    return {
+        "model": model,
+        "messages": [
+            _SYSTEM_MESSAGE,
+            {"role": "user", "content": _build_prompt(shard, start_idx, model)}
+        ],
+        "temperature": 0.3,
+        "max_tokens": max_tokens,
+        "response_format": RESPONSE_FORMAT
+    }
+
+
+def _request_cache_key(request, cust_id, client_id):
+    """Cache key for a shard request: the client scope, PROMPT_VERSION and the full request body"""
+    return content_hash('bullets', PROMPT_VERSION, cust_id, client_id,
+                        json.dumps(request, sort_keys=True, ensure_ascii=False))
+
+
+def _parse_content(content):
+    """Parse the sections list out of the response JSON text"""
+    content = content.strip()
+    
+    # Parse JSON response (can still fail if the output hit max_tokens)
+    try:
+        result = json.loads(content)
+    except json.JSONDecodeError:
+        log_debug(f"[BULLET_SUMMARIZER] [ERROR] Raw response: {content[:500]}")
+        raise
+    
+    return result.get('sections', [])
+
+
+def _parse_sections(response):
+    """
+    Parse the sections list out of a chat completion
+    
+    Returns:
+        tuple: (sections list, usage)
+    """
+    message = response.choices[0].message
+    if getattr(message, 'refusal', None):
+        raise RuntimeError(f"Model refused the request: {message.refusal}")
+    return _parse_content(message.content), response.usage
+
+
+class _SectionStream:
+    """
+    Pulls completed section objects out of a streamed {"sections": [...]} response
+    as soon as each one's closing brace arrives (only used when on_section is given)
+    
+    Consumed text is dropped as sections complete, so only the section still being
+    streamed is kept and re-joined - each chunk is handled in roughly constant time.
+    """
+    
+    def __init__(self):
+        self._pending = []  # Unconsumed chunks (from inside the sections array once started)
+        self._started = False
+        self._decoder = json.JSONDecoder()
+    
+    def feed(self, text):
+        """Add streamed text; returns the sections completed by it"""
+        self._pending.append(text)
+        if not self._started:
+            if '[' not in text:
+                return []
+            head = "".join(self._pending)
+            self._pending = [head[head.index('[') + 1:]]
+            self._started = True
+        if '}' not in text:
+            return []
+        
+        buffer = "".join(self._pending)
+        pos = 0
+        completed = []
+        while True:
+            # Skip whitespace and commas between array items
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= len(buffer) or buffer[pos] != '{':
+                break
+            try:
+                section, pos = self._decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break  # Object not complete yet
+            completed.append(section)
+        self._pending = [buffer[pos:]]
+        return completed
+
+
+def _emit_sections(on_section, sections):
+    """Pass already-complete sections (cache hits, batch results) to the on_section callback"""
+    if on_section:
+        for section in sections:
+            on_section(section)
+
+
+class RateLimiter:
+    """
+    Token bucket over requests per minute and tokens per minute
+    
+    acquire() reserves the request's tokens straight away and, when that takes a
+    budget below zero, sleeps until the refill has covered the debt - so callers
+    are paced in arrival order at the limit line instead of running into 429s.
+    Budgets refill continuously at limit/60 per second.
+    
+    State is guarded by a threading.Lock and no asyncio object is held, so one
+    instance is shared by every call (and event loop) in the process.
+    """
+    
+    def __init__(self, tokens_per_minute, requests_per_minute):
+        self.tokens_per_minute = tokens_per_minute
+        self.requests_per_minute = requests_per_minute
+        self._tokens = float(tokens_per_minute)
+        self._requests = float(requests_per_minute)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+        self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+    
+    async def acquire(self, tokens):
+        """Reserve a request estimated at `tokens` tokens, waiting until both budgets cover it"""
+        # A request larger than the whole budget still has to be able to go
+        tokens = min(tokens, self.tokens_per_minute)
+        with self._lock:
+            self._refill()
+            self._tokens -= tokens
+            self._requests -= 1
+            wait = max(
+                -self._tokens * 60 / self.tokens_per_minute,
+                -self._requests * 60 / self.requests_per_minute
+            )
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+# Shared by every run in this process (each CGI process / WSGI worker has its own budget)
+_RATE_LIMITER = RateLimiter(TPM_LIMIT, RPM_LIMIT)
+
+
+def _estimate_tokens(request):
+    """Upper-bound token cost of a request: prompt tokens plus the max_tokens reserve"""
+    return sum(count_tokens(message['content'], request['model']) for message in request['messages']) \
+        + request['max_tokens']
+
+
+def _make_client():
+    """
+    AsyncOpenAI client with an explicitly sized httpx pool (HTTP/2 when h2 is installed)
+    
+    Created per run: the pool is bound to the event loop of asyncio.run(), so a
+    module-level client would break on the next call in the same process.
+    """
+    http_client = httpx.AsyncClient(
+        transport=httpx.AsyncHTTPTransport(retries=0, http2=HTTP2_AVAILABLE),
+        limits=HTTP_LIMITS,
+        timeout=HTTP_TIMEOUT
+    )
+    return AsyncOpenAI(api_key=conf.OPENAI_API_KEY, http_client=http_client)
+
+
+def _is_retryable(error):
+    """Transient API failures worth retrying (an exhausted quota is not transient)"""
+    if isinstance(error, openai.RateLimitError) and getattr(error, 'code', None) == 'insufficient_quota':
+        return False
+    return isinstance(error, _RETRYABLE_ERRORS)
+
+
+async def _stream_shard(client, request, on_section):
+    """
+    Make one streamed API call for a shard
+    
+    Args:
+        on_section (callable): Called with each section as soon as it has streamed in
+    
+    Returns:
+        tuple: (sections list, usage)
+    """
+    chunks = []
+    usage = None
+    section_stream = _SectionStream() if on_section else None
+    
+    stream = await client.chat.completions.create(
+        **request, stream=True, stream_options={"include_usage": True}
+    )
+    async for chunk in stream:
+        # Usage arrives on the final chunk (which has no choices)
+        if chunk.usage:
+            usage = chunk.usage
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if getattr(delta, 'refusal', None):
+            raise RuntimeError(f"Model refused the request: {delta.refusal}")
+        if delta.content:
+            chunks.append(delta.content)
+            if section_stream:
+                for section in section_stream.feed(delta.content):
+                    on_section(section)
+    
+    return _parse_content("".join(chunks)), usage or _NO_USAGE
+
+
+async def _summarize_shard(client, semaphore, rate_limiter, request, on_section=None):
+    """
+    Summarize one shard of documents with a single streamed API call, retried with
+    randomized exponential backoff on transient failures (including a dropped stream)
+    
+    Once a section has been passed to on_section the shard is not retried: a new
+    completion may order or split its sections differently, so its sections could not
+    be lined up with the ones already emitted.
+    
+    Args:
+        on_section (callable): Called with each section as soon as it has streamed in
+    
+    Returns:
+        tuple: (sections list, usage)
+    """
+    emitted = []
+    estimated_tokens = _estimate_tokens(request)
+    
+    def emit(section):
+        emitted.append(section)
+        on_section(section)
+    
+    # The SDK's own retries are disabled here so attempts are not multiplied
+    client = client.with_options(max_retries=0)
+    for attempt in range(1, API_MAX_ATTEMPTS + 1):
+        try:
+            async with semaphore:
+                await rate_limiter.acquire(estimated_tokens)
+                return await _stream_shard(client, request, emit if on_section else None)
+        except Exception as e:
+            if attempt == API_MAX_ATTEMPTS or not _is_retryable(e):
+                raise
+            if emitted:
+                log_debug(f"[BULLET_SUMMARIZER] [ERROR] Stream failed after {len(emitted)} section(s) "
+                          f"were emitted, not retrying ({type(e).__name__}: {e})")
+                raise
+            # Slot released while waiting so other shards can proceed
+            wait = random.uniform(0, min(RETRY_MAX_WAIT, RETRY_MIN_WAIT * 2 ** attempt))
+            log_debug(f"[BULLET_SUMMARIZER] [WARNING] Attempt {attempt}/{API_MAX_ATTEMPTS} failed "
+                      f"({type(e).__name__}: {e}), retrying in {wait:.1f}s")
+            await asyncio.sleep(wait)
+
+
+async def _summarize_shards_batch(client, requests):
+    """
+    Summarize all shards through the OpenAI Batch API (one JSONL line per shard)
+    
+    Batch jobs are billed at half price and use a separate rate-limit pool, but may
+    take minutes to hours - only for offline/bulk report runs.
+    
+    Returns:
+        list: (sections list, usage) per shard, in shard order
+    """
+    lines = [
+        json.dumps({
+            "custom_id": f"shard-{i}",
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": request
+        }, ensure_ascii=False)
+        for i, request in enumerate(requests)
+    ]
+    batch_input = io.BytesIO("\n".join(lines).encode('utf-8'))
+    
+    input_file = await client.files.create(file=("bullet_shards.jsonl", batch_input), purpose="batch")
+    batch = await client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+    log_debug(f"[BULLET_SUMMARIZER] Batch {batch.id} submitted with {len(requests)} request(s)")
+    
+    # Poll with exponential backoff until the batch reaches a final state
+    delay = BATCH_POLL_INITIAL
+    while batch.status not in ('completed', 'failed', 'expired', 'cancelled'):
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, BATCH_POLL_MAX)
+        batch = await client.batches.retrieve(batch.id)
+    
+    if batch.status != 'completed' or not batch.output_file_id:
+        raise RuntimeError(f"Batch {batch.id} ended with status '{batch.status}'")
+    
+    output = await client.files.content(batch.output_file_id)
+    responses = {}
+    for line in output.text.splitlines():
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        if item.get('error') or item['response']['status_code'] != 200:
+            raise RuntimeError(f"Batch request {item['custom_id']} failed: {item.get('error') or item['response']['body']}")
+        responses[item['custom_id']] = ChatCompletion.model_validate(item['response']['body'])
+    
+    missing = [f"shard-{i}" for i in range(len(requests)) if f"shard-{i}" not in responses]
+    if missing:
+        raise RuntimeError(f"Batch {batch.id} returned no result for {', '.join(missing)}")
+    
+    return [_parse_sections(responses[f"shard-{i}"]) for i in range(len(requests))]
+
+
+def _build_merge_request(sections, model, max_tokens):
+    """Build the reduce-step request: the shards' sections as JSON, no documents"""
+    return {
+        "model": model,
+        "messages": [
+            _MERGE_SYSTEM_MESSAGE,
+            {"role": "user", "content": "SECTIONS:\n" + json.dumps({"sections": sections}, ensure_ascii=False)}
+        ],
+        "temperature": 0.3,
+        "max_tokens": max_tokens,
+        "response_format": RESPONSE_FORMAT
+    }
+
+
+async def _reduce_sections(client, rate_limiter, sections, model, max_tokens, cust_id, client_id):
+    """
+    Merge the shards' sections with one API call (cached like the shard calls)
+    
+    Returns:
+        tuple: (sections list, usage, number of API calls made)
+    """
+    request = _build_merge_request(sections, model, max_tokens)
+    cache_key = _request_cache_key(request, cust_id, client_id)
+    cached_sections = cache_get(cache_key)
+    if cached_sections is not None:
+        return cached_sections, _NO_USAGE, 0
+    
+    merged_sections, usage = await _summarize_shard(client, asyncio.Semaphore(1), rate_limiter, request)
+    if merged_sections:
+        cache_set(cache_key, merged_sections, ttl=LLM_CACHE_TTL)
+    return merged_sections, usage, 1
 
-# Initialize OpenAI client
-client = OpenAI(api_key=conf.OPENAI_API_KEY)
+
+def merge_sections(shard_sections):
+    """
+    Merge per-shard section lists, combining sections whose headers match
+    (case and whitespace insensitive). First-seen header spelling and order win.
+    
+    Args:
+        shard_sections (list): One list of section dicts per shard
+        
+    Returns:
+        list: Merged section dicts with 'header' and 'bullets'
+    """
+    merged = {}
+    for sections in shard_sections:
+        for section in sections:
+            header = section.get('header', 'Unknown')
+            key = " ".join(str(header).split()).casefold()
+            if key not in merged:
+                merged[key] = {'header': header, 'bullets': []}
+            merged[key]['bullets'].extend(section.get('bullets', []))
+    return list(merged.values())
 
 
 def process_documents_bullets(documents, chunk_size=5, ip_address=None, model='gpt-4o-mini', 
                               max_tokens=4000, client_int_doc_ids=None, journal_doc_ids=None, 
-                              internal_doc_id=None, client_id=0, cust_id=0, user_id=0, report_type=None):
+                              internal_doc_id=None, client_id=0, cust_id=0, user_id=0, report_type=None,
+                              use_batch=False, on_section=None):
+    """
+    Synchronous wrapper around process_documents_bullets_async (same arguments and result)
+    """
+    return asyncio.run(process_documents_bullets_async(
+        documents, chunk_size=chunk_size, ip_address=ip_address, model=model,
+        max_tokens=max_tokens, client_int_doc_ids=client_int_doc_ids,
+        journal_doc_ids=journal_doc_ids, internal_doc_id=internal_doc_id,
+        client_id=client_id, cust_id=cust_id, user_id=user_id, report_type=report_type,
+        use_batch=use_batch, on_section=on_section
+    ))
+
+
+async def process_documents_bullets_async(documents, chunk_size=5, ip_address=None, model='gpt-4o-mini', 
+                                          max_tokens=4000, client_int_doc_ids=None, journal_doc_ids=None, 
+                                          internal_doc_id=None, client_id=0, cust_id=0, user_id=0, report_type=None,
+                                          use_batch=False, on_section=None):
     """
     Process diverse/unpredictable documents and generate organized summaries with dynamic headers
     
@@ -40,7 +571,7 @@ def process_documents_bullets(documents, chunk_size=5, ip_address=None, model='g
     
     Args:
         documents (list): List of processed documents
-        chunk_size (int): Number of documents to process at once
+        chunk_size (int): Number of documents per request (shards run concurrently)
         ip_address (str): IP address for logging
         model (str): OpenAI model to use
         max_tokens (int): Maximum output tokens
@@ -50,12 +581,13 @@ def process_documents_bullets(documents, chunk_size=5, ip_address=None, model='g
         client_id (int): Client ID
         cust_id (int): Customer ID
         user_id (int): User ID
+        use_batch (bool): Submit the shards as one Batch API job (half price, not interactive)
+        on_section (callable): Called with each shard section (before merging) as soon as it
+            is available, e.g. to stream partial HTML via generate_html_from_sections([section])
         
     Returns:
         dict: Results with organized sections (headers + bullets) and metadata
     """
-    language = 'svenska'
-    
     log_debug(f"[BULLET_SUMMARIZER] Processing {len(documents)} documents (NO TEMPLATE MODE)")
     log_debug(f"[BULLET_SUMMARIZER] Model: {model}, Max tokens: {max_tokens}")
     
@@ -68,102 +600,81 @@ def process_documents_bullets(documents, chunk_size=5, ip_address=None, model='g
             'html_output': ''
         }
     
-    # Build document context
-    doc_context = ""
-    for idx, doc in enumerate(documents, 1):
-        doc_name = doc.get('name', f'Document {idx}')
-        doc_text = doc.get('text', '')[:8000]  # Limit per doc to stay within token limits
-        word_count = doc.get('text_info', {}).get('word_count', 0)
-        created_date = doc.get('created_date', 'Unknown date')
-        
-        doc_context += f"\n{'='*60}\n"
-        doc_context += f"Document {idx}: {doc_name}\n"
-        doc_context += f"Date: {created_date} | Words: {word_count}\n"
-        doc_context += f"{'='*60}\n"
-        doc_context += f"{doc_text}\n\n"
-    
-    # Prompt for AI to create dynamic headers and organized content
-    prompt = f"""You are analyzing diverse documents to create a well-organized summary report in {language}.
-
-DOCUMENTS:
-{doc_context}
-
-TASK:
-Analyze ALL documents and create an organized summary with appropriate section headers based on the actual content.
-
-INSTRUCTIONS:
-1. Identify the 4-8 most important themes/topics across ALL documents
-2. Create a descriptive Swedish section header for each theme (e.g., "HÄLSA OCH VÅRD", "UTBILDNING", "BETEENDE OCH UTVECKLING", "SOCIALA RELATIONER")
-3. Under each header, provide 3-8 bullet points (15-40 words each)
-4. Include specific dates, names, facts, and important details
-5. Highlight dates by wrapping them: {{{{HIGHLIGHT}}}}date{{{{/HIGHLIGHT}}}}
-6. Combine related information from multiple documents
-7. Use professional svenska
-8. Section headers should be in ALL CAPS and descriptive
-
-RETURN FORMAT (JSON):
-{{
-  "sections": [
-    {{
-      "header": "DESCRIPTIVE SECTION NAME IN CAPS",
-      "bullets": [
-        "Bullet point 1 with specific details and facts",
-        "Bullet point 2 with dates and information",
-        "Bullet point 3..."
-      ]
-    }},
-    {{
-      "header": "ANOTHER RELEVANT SECTION",
-      "bullets": [
-        "Bullet point 1",
-        "Bullet point 2"
-      ]
-    }}
-  ]
-}}
-
-**CRITICAL REQUIREMENTS**:
-- Create 4-8 sections based on actual document content
-- Headers should reflect the ACTUAL topics found in the documents
-- Each section must have 3-8 substantive bullet points
-- All content must be in svenska
-- Include ALL important information from the documents
-- Do not create empty or generic sections
-"""
-
     try:
         start_time = time.time()
         
-        log_debug("[BULLET_SUMMARIZER] Calling OpenAI API for dynamic header generation...")
+        # Shard the documents and summarize the shards concurrently
+        shards = [documents[i:i + chunk_size] for i in range(0, len(documents), chunk_size)]
+        requests = [_build_request(shard, i * chunk_size + 1, model, max_tokens)
+                    for i, shard in enumerate(shards)]
+        log_debug(f"[BULLET_SUMMARIZER] Calling OpenAI API for {len(shards)} shard(s) of up to {chunk_size} documents"
+                  f"{' (batch)' if use_batch else ''}...")
         
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": f"You are an expert at analyzing diverse documents and creating well-organized summaries with appropriate section headers in {language}. You identify key themes and organize information logically."
-                },
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            max_tokens=max_tokens,
-            response_format={"type": "json_object"}
-        )
+        # Shards whose exact request was answered before skip the API call
+        cache_keys = [_request_cache_key(request, cust_id, client_id) for request in requests]
+        shard_results = [None] * len(requests)
+        for i, cache_key in enumerate(cache_keys):
+            cached_sections = cache_get(cache_key)
+            if cached_sections is not None:
+                shard_results[i] = (cached_sections, _NO_USAGE)
+                _emit_sections(on_section, cached_sections)
+        pending = [i for i, result in enumerate(shard_results) if result is None]
+        if len(pending) < len(requests):
+            log_debug(f"[BULLET_SUMMARIZER] [CACHE] {len(requests) - len(pending)} shard(s) served from cache")
+        
+        api_calls = 0
+        async with _make_client() as client:
+            rate_limiter = _RATE_LIMITER
+            
+            if pending:
+                pending_requests = [requests[i] for i in pending]
+                if use_batch:
+                    fresh_results = await _summarize_shards_batch(client, pending_requests)
+                    for fresh_sections, _ in fresh_results:
+                        _emit_sections(on_section, fresh_sections)
+                else:
+                    semaphore = asyncio.Semaphore(MAX_CONCURRENT_SHARDS)
+                    fresh_results = await asyncio.gather(*[
+                        _summarize_shard(client, semaphore, rate_limiter, request, on_section)
+                        for request in pending_requests
+                    ])
+                api_calls = len(pending_requests)
+                
+                for i, result in zip(pending, fresh_results):
+                    shard_results[i] = result
+                    # Never cache empty results
+                    if result[0]:
+                        cache_set(cache_keys[i], result[0], ttl=LLM_CACHE_TTL)
+            
+            usages = [usage for _, usage in shard_results]
+            sections = merge_sections([shard_sections for shard_sections, _ in shard_results])
+            
+            # Reduce step: one small call over the shards' JSON merges themes that the
+            # shards named differently (falls back to the header-matched merge on failure)
+            if len(shards) > 1 and sections:
+                try:
+                    reduced_sections, reduce_usage, reduce_calls = await _reduce_sections(
+                        client, rate_limiter, sections, model, max_tokens, cust_id, client_id
+                    )
+                    if reduced_sections:
+                        sections = reduced_sections
+                    usages.append(reduce_usage)
+                    api_calls += reduce_calls
+                except Exception as e:
+                    log_debug(f"[BULLET_SUMMARIZER] [WARNING] Section merge call failed, using header merge: {e}")
         
         elapsed = time.time() - start_time
-        content = response.choices[0].message.content.strip()
         
-        # Parse JSON response
-        result = json.loads(content)
-        sections = result.get('sections', [])
+        prompt_tokens = sum(usage.prompt_tokens for usage in usages)
+        completion_tokens = sum(usage.completion_tokens for usage in usages)
+        total_tokens = sum(usage.total_tokens for usage in usages)
         
         # Calculate statistics
         total_bullets = sum(len(section.get('bullets', [])) for section in sections)
-        usage = response.usage
         
         log_debug(f"[BULLET_SUMMARIZER] [SUCCESS] Generated in {elapsed:.1f}s")
         log_debug(f"[BULLET_SUMMARIZER] [STATS] Sections: {len(sections)} | Total bullets: {total_bullets}")
-        log_debug(f"[BULLET_SUMMARIZER] [STATS] Tokens: {usage.total_tokens}")
+        log_debug(f"[BULLET_SUMMARIZER] [STATS] Tokens: {total_tokens}")
         
         # Log section headers
         for section in sections:
@@ -171,38 +682,35 @@ RETURN FORMAT (JSON):
             bullet_count = len(section.get('bullets', []))
             log_debug(f"[BULLET_SUMMARIZER]   - {header}: {bullet_count} bullets")
         
-        # Calculate costs
-        INPUT_COST_PER_1M = 0.15
-        OUTPUT_COST_PER_1M = 0.60
+        # Calculate costs (tblAiModels pricing, cached per process; built-in default
+        # only when the model has no pricing row)
+        pricing = model_pricing(model)
+        if not (pricing["inputCostPerM"] or pricing["outputCostPerM"]):
+            pricing = DEFAULT_PRICING.get(model, pricing)
         
-        input_cost = (usage.prompt_tokens / 1_000_000) * INPUT_COST_PER_1M
-        output_cost = (usage.completion_tokens / 1_000_000) * OUTPUT_COST_PER_1M
+        input_cost = (prompt_tokens / 1_000_000) * pricing["inputCostPerM"]
+        output_cost = (completion_tokens / 1_000_000) * pricing["outputCostPerM"]
         total_cost = input_cost + output_cost
         
-        # Adjust pricing for different models
-        if model not in ["gpt-4o-mini"]:
-            pricing = model_pricing(model)
-            if pricing:
-                input_cost = (usage.prompt_tokens / 1_000_000) * pricing["inputCostPerM"]
-                output_cost = (usage.completion_tokens / 1_000_000) * pricing["outputCostPerM"]
-                total_cost = input_cost + output_cost
+        if use_batch:
+            input_cost *= BATCH_PRICE_FACTOR
+            output_cost *= BATCH_PRICE_FACTOR
+            total_cost = input_cost + output_cost
         
         log_debug(f"[BULLET_SUMMARIZER] [COST] Input: ${input_cost:.6f}, Output: ${output_cost:.6f}, Total: ${total_cost:.6f}")
         
-        # Generate HTML output
-        html_output = generate_html_from_sections(sections)
-        
-        # Log to database
+        # Log to database (queued: the row is inserted by db_model's background writer,
+        # so the insert overlaps HTML rendering and the response instead of delaying them)
         log_data = {
             'cid': cust_id,
             'user_id': user_id,
             'client_id': client_id,
             'document_count': len(documents),
-            'prompt_tokens': usage.prompt_tokens,
-            'completion_tokens': usage.completion_tokens,
-            'total_tokens': usage.total_tokens,
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': total_tokens,
             'model': model,
-            'api_calls': 1,
+            'api_calls': api_calls,
             'input_cost': input_cost,
             'output_cost': output_cost,
             'total_cost': total_cost,
@@ -214,7 +722,10 @@ RETURN FORMAT (JSON):
             'chrReportType': report_type
         }
         log_to_database(log_data)
-        log_debug("[BULLET_SUMMARIZER] Database logging completed")
+        log_debug("[BULLET_SUMMARIZER] Database log queued")
+        
+        # Generate HTML output
+        html_output = generate_html_from_sections(sections)
         
         return {
             'status': 'success',
@@ -222,9 +733,9 @@ RETURN FORMAT (JSON):
             'html_output': html_output,     # Ready-to-use HTML
             'section_count': len(sections),
             'bullet_count': total_bullets,
-            'tokens': usage.total_tokens,
-            'input_tokens': usage.prompt_tokens,
-            'output_tokens': usage.completion_tokens,
+            'tokens': total_tokens,
+            'input_tokens': prompt_tokens,
+            'output_tokens': completion_tokens,
             'time': elapsed,
             'input_cost': round(input_cost, 6),
             'output_cost': round(output_cost, 6),
@@ -233,7 +744,6 @@ RETURN FORMAT (JSON):
         
     except json.JSONDecodeError as e:
         log_debug(f"[BULLET_SUMMARIZER] [ERROR] JSON parsing error: {e}")
-        log_debug(f"[BULLET_SUMMARIZER] [ERROR] Raw response: {content[:500]}")
         return {
             'status': 'error',
             'error': f'Failed to parse AI response: {str(e)}',
@@ -242,9 +752,7 @@ RETURN FORMAT (JSON):
         }
         
     except Exception as e:
-        log_debug(f"[BULLET_SUMMARIZER] [ERROR] Error: {e}")
-        import traceback
-        log_debug(f"[BULLET_SUMMARIZER] [ERROR] Traceback:\n{traceback.format_exc()}")
+        log_exception(f"[BULLET_SUMMARIZER] [ERROR] Error: {e}")
         
         return {
             'status': 'error',
@@ -258,6 +766,20 @@ RETURN FORMAT (JSON):
         }
 
 
+_HTML_OPEN = '<div style="font-family: Verdana, Arial, sans-serif; max-width: 800px; margin: 20px;">'
+_HTML_HEADER_OPEN = '<div style="margin-top: 25px; margin-bottom: 10px;">'
+_HTML_DIV_CLOSE = '</div>'
+_HTML_LIST_OPEN = '<ul style="list-style-type: disc; padding-left: 25px; line-height: 1.8; margin: 10px 0;">'
+_HTML_LIST_CLOSE = '</ul>'
+_HIGHLIGHT_OPEN = '<span style="background-color: #fbbf24; padding: 2px 6px; border-radius: 3px;">'
+_HIGHLIGHT_RE = re.compile(r'\{\{(/?)HIGHLIGHT\}\}')
+
+
+def _highlight_tag(match):
+    """Replacement for a {{HIGHLIGHT}} / {{/HIGHLIGHT}} marker"""
+    return '</span>' if match.group(1) else _HIGHLIGHT_OPEN
+
+
 def generate_html_from_sections(sections):
     """
     Generate formatted HTML from sections with headers and bullets
@@ -268,9 +790,7 @@ def generate_html_from_sections(sections):
     Returns:
         str: Formatted HTML string
     """
-    html_parts = []
-    
-    html_parts.append('<div style="font-family: Verdana, Arial, sans-serif; max-width: 800px; margin: 20px;">')
+    html_parts = [_HTML_OPEN]
     
     for section in sections:
         header = section.get('header', 'UNKNOWN SECTION')
@@ -280,22 +800,18 @@ def generate_html_from_sections(sections):
             continue
         
         # Section header
-        html_parts.append(f'<div style="margin-top: 25px; margin-bottom: 10px;">')
+        html_parts.append(_HTML_HEADER_OPEN)
         html_parts.append(f'<strong style="font-size: 11pt;">{header}</strong>')
-        html_parts.append('</div>')
-        
-        # Bullet list
-        html_parts.append('<ul style="list-style-type: disc; padding-left: 25px; line-height: 1.8; margin: 10px 0;">')
+        html_parts.append(_HTML_DIV_CLOSE)
         
-        for bullet in bullets:
-            # Handle date highlighting
-            bullet_html = str(bullet).replace('{{HIGHLIGHT}}', '<span style="background-color: #fbbf24; padding: 2px 6px; border-radius: 3px;">')
-            bullet_html = bullet_html.replace('{{/HIGHLIGHT}}', '</span>')
-            
-            html_parts.append(f'<li style="margin-bottom: 8px;">{bullet_html}</li>')
-        
-        html_parts.append('</ul>')
+        # Bullet list (date highlight markers replaced in one pass per bullet)
+        html_parts.append(_HTML_LIST_OPEN)
+        html_parts.extend(
+            f'<li style="margin-bottom: 8px;">{_HIGHLIGHT_RE.sub(_highlight_tag, str(bullet))}</li>'
+            for bullet in bullets
+        )
+        html_parts.append(_HTML_LIST_CLOSE)
     
-    html_parts.append('</div>')
+    html_parts.append(_HTML_DIV_CLOSE)
     
-    return '\n'.join(html_parts)
\ No newline at end of file
+    return '\n'.join(html_parts)
@@ -3,6 +3,13 @@ from datetime import datetime
 import sys
 import json
 import tempfile
+import atexit
+import queue
+import threading
+import logging
+import multiprocessing
+import multiprocessing.util
+from logging.handlers import QueueHandler, QueueListener
 
 # Fix for Windows IIS - Set UTF-8 encoding for stdout
 if sys.platform == 'win32':
@@ -14,30 +21,118 @@ if sys.platform == 'win32':
 
 LOG_FILE = os.path.join(tempfile.gettempdir(), 'ai_summary_debug.log')
 
+# log_debug only enqueues the record; a QueueListener thread appends it to the file.
+# The file is shared by every CGI process and pool worker, so it is never rotated here:
+# stdlib rotation renames the file, which is not safe across processes (on Windows the
+# rename fails while another process holds it open). Trim or archive it outside the app.
+_LOG_Q = queue.Queue(maxsize=10000)
+_logger = logging.getLogger("ai_summary")
+_logger.setLevel(logging.DEBUG)
+_logger.propagate = False
+_file_handler = None
+_listener = None
+_listener_lock = threading.Lock()
+
+
+class _DroppingQueueHandler(QueueHandler):
+	"""QueueHandler that drops records instead of reporting an error when the queue is full"""
+
+	def enqueue(self, record):
+		try:
+			self.queue.put_nowait(record)
+		except queue.Full:
+			pass
+
+
+_queue_handler = _DroppingQueueHandler(_LOG_Q)
+_logger.addHandler(_queue_handler)
+
+
+def _ensure_log_writer():
+	"""Create the file handler and start the listener thread on first use"""
+	global _file_handler, _listener
+	if _listener is not None:
+		return
+	with _listener_lock:
+		if _listener is None:
+			if _file_handler is None:
+				_file_handler = logging.FileHandler(LOG_FILE, mode='a', encoding='utf-8', delay=True)
+				_file_handler.setFormatter(logging.Formatter('[%(asctime)s] %(message)s', '%Y-%m-%d %H:%M:%S'))
+			listener = QueueListener(_LOG_Q, _file_handler)
+			listener.start()
+			_listener = listener
+			if multiprocessing.parent_process() is not None:
+				# Pool workers (e.g. extraction processes) may leave through os._exit,
+				# which skips atexit; multiprocessing finalizers still run there
+				multiprocessing.util.Finalize(None, flush_log, exitpriority=10)
+
+
+def flush_log():
+	"""Write all queued records and stop the listener thread (registered with atexit)"""
+	global _listener
+	with _listener_lock:
+		listener = _listener
+		_listener = None
+	if listener is None:
+		return
+	listener.stop()
+	_file_handler.flush()
+
+
+atexit.register(flush_log)
+
+
+def _reset_after_fork():
+	"""
+	A forked child inherits _listener but not its thread, so nothing would drain the
+	queue: start over with a fresh queue, lock and file handler (created on first use)
+	"""
+	global _LOG_Q, _listener, _listener_lock, _file_handler
+	_LOG_Q = queue.Queue(maxsize=10000)
+	_queue_handler.queue = _LOG_Q
+	_listener = None
+	_listener_lock = threading.Lock()
+	_file_handler = None
+
+
+if hasattr(os, 'register_at_fork'):
+	os.register_at_fork(after_in_child=_reset_after_fork)
+
+
 def log_debug(message, also_print=False):
 	"""
 	Write debug messages to log file in TEMP folder
 	
+	The record is queued and written by a background thread (dropped, never
+	blocking the caller, if the queue is full). Every process appends to the
+	same file, which is not rotated.
+	
 	Args:
 		message (str): Message to log
 		also_print (bool): If True, also print to console (useful for debugging)
 	"""
-	try:
-		with open(LOG_FILE, 'a', encoding='utf-8') as f:
-			timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-			log_line = f"[{timestamp}] {message}\n"
-			f.write(log_line)
-			
-			# Also print if requested (useful during development)
-			if also_print:
-				print(f"DEBUG: {message}", file=sys.stderr)
-				sys.stderr.flush()
-	except Exception as e:
-		# If logging fails, at least try to print the error
+	_ensure_log_writer()
+	_logger.debug(message)
+	
+	# Also print if requested (useful during development)
+	if also_print:
 		try:
-			print(f"LOGGING ERROR: {str(e)}", file=sys.stderr)
+			print(f"DEBUG: {message}", file=sys.stderr)
+			sys.stderr.flush()
 		except:
-			pass  # Silently fail if even that doesn't work
+			pass
+
+
+def log_exception(message):
+	"""
+	Log a message followed by the traceback of the exception being handled
+	(call from an except block)
+	
+	Args:
+		message (str): Message to log
+	"""
+	_ensure_log_writer()
+	_logger.exception(message)
 
 
 def get_log_file_path():
@@ -47,6 +142,10 @@ def get_log_file_path():
 
 def clear_log():
 	"""Clear the log file (useful for starting fresh)"""
+	flush_log()
+	if _file_handler is not None:
+		# Reopened on the next write
+		_file_handler.close()
 	try:
 		with open(LOG_FILE, 'w', encoding='utf-8') as f:
 			f.write(f"Log cleared at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
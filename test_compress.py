@@ -0,0 +1,27 @@
+# test_compress.py
+"""
+Tests for compress_doc_text (layout-noise cleanup before text is sent to the LLM)
+"""
+
+from utils.compress import compress_doc_text
+
+
+def test_removes_page_markers_only():
+    text = (
+        "\n--- Page 1 ---\nRubrik\n"
+        "3 av 5\nPage 3 of 5\nSida 4 av 5\n"
+        # Content that merely looks like numbering is kept
+        "Sida 2\n12 (3)\n- 3 -\n"
+        "--- Page 2 ---\nslut"
+    )
+    assert compress_doc_text(text) == "Rubrik\nSida 2\n12 (3)\n- 3 -\nslut"
+
+
+def test_collapses_spaces_blank_lines_and_repeats():
+    text = "Mål:   att  x\n\n\n\n  Mål:   att  x  \nInsats\nInsats\n\nslut"
+    assert compress_doc_text(text) == "Mål: att x\n\nMål: att x\nInsats\n\nslut"
+
+
+def test_caps_length():
+    assert compress_doc_text("ord " * 100, max_chars=20) == ("ord " * 5)[:20]
+    assert compress_doc_text("") == ""
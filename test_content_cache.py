@@ -0,0 +1,91 @@
+# test_content_cache.py
+"""
+Tests for the content cache backends: LRU size cap, TTL expiry and disk pruning
+"""
+
+import sqlite3
+
+import pytest
+
+from utils import content_cache
+from utils.content_cache import cache_get, cache_set, content_hash
+
+
+@pytest.fixture
+def memory_cache(monkeypatch):
+    monkeypatch.setattr(content_cache, "CACHE_BACKEND", "memory")
+    monkeypatch.setattr(content_cache, "MAX_ENTRIES", 3)
+    monkeypatch.setattr(content_cache, "_memory", content_cache.OrderedDict())
+
+
+@pytest.fixture
+def disk_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(content_cache, "CACHE_BACKEND", "disk")
+    monkeypatch.setattr(content_cache, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(content_cache, "CACHE_FILE", str(tmp_path / "cache.sqlite"))
+    monkeypatch.setattr(content_cache, "MAX_ENTRIES", 3)
+    monkeypatch.setattr(content_cache, "PRUNE_EVERY", 1)
+    monkeypatch.setattr(content_cache, "_local", content_cache.threading.local())
+    yield str(tmp_path / "cache.sqlite")
+    conn = getattr(content_cache._local, "conn", None)
+    if conn is not None:
+        conn.close()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.time() for TTL tests"""
+    now = [1000.0]
+    monkeypatch.setattr(content_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_content_hash_keeps_part_boundaries():
+    assert content_hash("ab", "c") != content_hash("a", "bc")
+    assert content_hash("a", "b") == content_hash("a", "b")
+
+
+def test_memory_round_trip_and_lru_eviction(memory_cache):
+    for key in "abc":
+        cache_set(key, {"key": key})
+    assert cache_get("a") == {"key": "a"}  # 'a' becomes most recently used
+    cache_set("d", [1, 2])
+    
+    assert cache_get("b") is None
+    assert cache_get("a") == {"key": "a"}
+    assert cache_get("d") == [1, 2]
+
+
+def test_memory_ttl(memory_cache, clock):
+    cache_set("short", "x", ttl=10)
+    cache_set("default", "y")
+    clock[0] += 11
+    assert cache_get("short") is None
+    assert cache_get("default") == "y"
+    # ttl is capped at DEFAULT_TTL
+    cache_set("long", "z", ttl=content_cache.DEFAULT_TTL * 10)
+    clock[0] += content_cache.DEFAULT_TTL + 1
+    assert cache_get("long") is None
+
+
+def test_off_backend(monkeypatch):
+    monkeypatch.setattr(content_cache, "CACHE_BACKEND", "off")
+    cache_set("k", "v")
+    assert cache_get("k") is None
+
+
+def test_disk_ttl_and_prune(disk_cache, clock):
+    cache_set("old", "x", ttl=10)
+    assert cache_get("old") == "x"
+    clock[0] += 11
+    assert cache_get("old") is None
+    
+    for i in range(4):
+        clock[0] += 1
+        cache_set(f"k{i}", i)
+    
+    with sqlite3.connect(disk_cache) as conn:
+        keys = [row[0] for row in conn.execute("SELECT cache_key FROM content_cache ORDER BY created")]
+    # Expired row and the oldest row beyond MAX_ENTRIES are pruned
+    assert keys == ["k1", "k2", "k3"]
+    assert cache_get("k3") == 3
@@ -7,79 +7,141 @@ WITH UNMAPPED SECTION HANDLING AND TEMPLATE FALLBACK
 
 import sys
 import os
+import io
 import json
 import time
 import re
+from contextlib import contextmanager
 from datetime import datetime
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Simple import suppression
 import warnings
 warnings.filterwarnings('ignore')
 
 SUCCESSFUL_IMPORTS = True 
 
+# Only what every request needs is imported here. The summarizers, template modules
+# and file extractors (OCR, PDF libraries) are imported on the code path that uses them.
 try:
     import pyodbc
     from save_logs import log_debug
     from convert_html_to_text import html_to_text, get_text_summary_info
-    from openai_summarizer_bullets import process_documents_bullets
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
     
-    # ===== FILE PROCESSING IMPORTS =====
-    from extractors.file_processor import process_file
-    from concurrent.futures import ThreadPoolExecutor, as_completed
-    
-    from db_model import get_db_connection
-    from utils.template_analyzer import analyze_template
-    from utils.template_mapper import map_bullets_to_template
-    from utils.openai_summarizer_with_template import generate_section_specific_summaries, generate_content_for_unmapped_sections
-
-    from utils.template_analyzer_vardplan import analyze_vardplan_template
-    from utils.template_mapper_vardplan import map_vardplan_bullets
-    from utils.content_summarizer_vardplan import summarize_vardplan_content
+    from db_model import get_db_connection, release_db_connection
 except ImportError as e:
     SUCCESSFUL_IMPORTS = False
     IMPORT_ERROR_MSG = str(e)
 
+# Long-lived threads for the SQL/import warm-up overlap (files go to get_scheduler())
+_GLOBAL_POOL = ThreadPoolExecutor(max_workers=4) if SUCCESSFUL_IMPORTS else None
+
+
+STATUS_MESSAGES = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}
+
+class _Halt(BaseException):
+    """Raised by return_json to end the request with a ready response
+
+    Derives from BaseException (like the SystemExit it replaces) so the
+    request's own `except Exception` handlers let it through to the entry point.
+    """
+    def __init__(self, status_code, body):
+        super().__init__(status_code)
+        self.status_code = status_code
+        self.body = body
+
+    @property
+    def status(self):
+        return f"{self.status_code} {STATUS_MESSAGES.get(self.status_code, 'Unknown')}"
+
 
 def return_json(data, status_code=200):
-    """Return JSON with proper headers for IIS"""
-    status_messages = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}
-    
+    """Finish the request with a JSON response (raises _Halt; the entry point sends it)"""
     try:
         log_debug(f"[RESPONSE] Returning status {status_code}")
     except:
         pass
     
-    # Create JSON
-    json_output = json.dumps(data, ensure_ascii=False, indent=2)
+    # Create JSON (compact UTF-8 bytes; non-str keys are stringified as json.dumps does)
+    if orjson is not None:
+        json_output = orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    else:
+        json_output = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    
+    raise _Halt(status_code, json_output)
+
+def _write_stdout(payload):
+    """Write raw bytes straight to the stdout file descriptor (one WriteFile call under IIS)"""
+    # Push out any text already printed so it stays ahead of the response
+    sys.stdout.flush()
+    try:
+        fd = sys.stdout.fileno()
+    except (AttributeError, ValueError, io.UnsupportedOperation):
+        # No real descriptor (wrapped/redirected stdout): go through the buffered layer
+        sys.stdout.buffer.write(payload)
+        sys.stdout.buffer.flush()
+        return
     
+    view = memoryview(payload)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+def _write_cgi_response(halt):
+    """Write a finished response to stdout with CGI headers"""
     try:
-        # Headers as text
-        sys.stdout.write(f"Status: {status_code} {status_messages.get(status_code, 'Unknown')}\r\n")
-        sys.stdout.write("Content-Type: application/json; charset=utf-8\r\n")
-        sys.stdout.write(f"Content-Length: {len(json_output.encode('utf-8'))}\r\n")
-        sys.stdout.write("\r\n")
-        sys.stdout.flush()
-        
-        # Body as text
-        sys.stdout.write(json_output)
-        sys.stdout.flush()
+        # Headers and body go out as one preformatted byte string (no text re-encode)
+        headers = (
+            f"Status: {halt.status}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(halt.body)}\r\n"
+            "\r\n"
+        ).encode('ascii')
+        _write_stdout(headers + halt.body)
         
         log_debug(f"[RESPONSE] JSON sent successfully")
     except Exception as e:
         log_debug(f"[RESPONSE] Error sending response: {e}")
+
+# Bytes requested from stdin per read while filling the POST buffer
+STDIN_CHUNK_SIZE = 64 * 1024
+# The request body is only logged when AI_API_DEBUG is set, and then only its start
+DEBUG_POST_BODY = bool(os.environ.get('AI_API_DEBUG'))
+POST_LOG_BYTES = 512
+
+def _read_body(stream, content_length):
+    """Read up to content_length bytes of the request body into one preallocated buffer"""
+    if not hasattr(stream, 'readinto'):
+        # Some WSGI servers hand over a minimal input object with read() only
+        return stream.read(content_length)
     
-    sys.exit(0)
+    buffer = bytearray(content_length)
+    view = memoryview(buffer)
+    received = 0
+    while received < content_length:
+        count = stream.readinto(view[received:received + STDIN_CHUNK_SIZE])
+        if not count:
+            break
+        received += count
+    view.release()
+    if received < content_length:
+        del buffer[received:]
+    return buffer
 
-def read_post_data():
-    """Read POST data"""
+def read_post_data(environ, stream):
+    """Read POST data from the request environment and body stream"""
     log_debug("[READ_POST] Starting to read POST data")
     
-    if os.environ.get('REQUEST_METHOD', '').upper() != 'POST':
+    if environ.get('REQUEST_METHOD', '').upper() != 'POST':
         log_debug("[ERROR] Not POST method")
         return_json({"success": False, "error": "Only POST method supported"}, 400)
 
-    content_length_str = os.environ.get('CONTENT_LENGTH')
+    content_length_str = environ.get('CONTENT_LENGTH')
     if not content_length_str:
         log_debug("[ERROR] No CONTENT_LENGTH")
         return_json({"success": False, "error": "No content length"}, 400)
@@ -94,92 +156,239 @@ def read_post_data():
         log_debug(f"[ERROR] Invalid CONTENT_LENGTH format: {content_length_str}")
         return_json({"success": False, "error": "Invalid content length format"}, 400)
         
-    # Read stdin as BINARY
-    log_debug("[READ_POST] Reading from stdin...")
+    # Read the body as BINARY
+    log_debug("[READ_POST] Reading request body...")
     try:
-        post_data_raw = sys.stdin.buffer.read(content_length)
-        post_data_str = post_data_raw.decode('utf-8')
-        log_debug(f"[READ_POST] Read {len(post_data_str)} bytes")
-        log_debug(f"[READ_POST] Received Data: {post_data_str}")
+        post_data_raw = _read_body(stream, content_length)
+        log_debug(f"[READ_POST] Read {len(post_data_raw)} bytes")
+        if DEBUG_POST_BODY:
+            log_debug(f"[READ_POST] Received Data: {bytes(post_data_raw[:POST_LOG_BYTES]).decode('utf-8', 'replace')}")
     except Exception as e:
         log_debug(f"[ERROR] Failed to read stdin: {e}")
         return_json({"success": False, "error": "Failed to read POST data"}, 400)
     
-    if not post_data_str:
+    if not post_data_raw:
         log_debug("[ERROR] Empty POST data")
         return_json({"success": False, "error": "Empty POST data"}, 400)
         
-    # Parse JSON
+    # Parse JSON straight from the UTF-8 bytes (no separate str copy is kept)
     try:
-        data = json.loads(post_data_str)
-        log_debug("[INFO] POST data parsed successfully. Received Data:", data)
+        if orjson is not None:
+            data = orjson.loads(post_data_raw)
+        else:
+            data = json.loads(post_data_raw)
+        del post_data_raw
+        log_debug("[INFO] POST data parsed successfully")
         return data
-    except json.JSONDecodeError as e:
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
         log_debug(f"[ERROR] JSON decode error: {str(e)}")
         return_json({"success": False, "error": f"Invalid JSON: {str(e)}"}, 400)
 
+# HTML markers and file-path extensions are decided from this many characters
+HTML_SNIFF_LENGTH = 4096
+_HTML_SNIFF_RE = re.compile(r'<(?:span|div|p[\s>]|table|html|body|!doctype)', re.IGNORECASE)
+_FILE_EXT_RE = re.compile(r'\.(?:pdf|docx?|jpe?g|png|gif)\s*$', re.IGNORECASE)
+
 def is_html_content(content):
     """Check if content is HTML or a file path"""
     if not content:
         return False
     
-    content_lower = content.strip().lower()
-    html_indicators = ['<span', '<div', '<p>', '<table', '<html', '<body', '<!doctype']
-    if any(indicator in content_lower for indicator in html_indicators):
+    # One regex pass over a bounded prefix; never lowercase the whole (possibly multi-MB) value
+    head = content[:HTML_SNIFF_LENGTH]
+    # File paths (the common non-HTML case) contain no '<' at all: one C-level scan settles it
+    if '<' not in head:
+        return False
+    if _HTML_SNIFF_RE.search(head):
         return True
     
     # ===== FILE DETECTION =====
-    file_extensions = ['.pdf', '.docx', '.doc', '.jpg', '.jpeg', '.png', '.gif']
-    if any(content_lower.endswith(ext) for ext in file_extensions):
+    if _FILE_EXT_RE.search(content[-HTML_SNIFF_LENGTH:]):
         return False
     
-    if content_lower.startswith('<'):
-        return True
-    
-    return False
+    return head.lstrip().startswith('<')
 
-def execute_sql_query(sql_query):
-    """Execute SQL query"""
+@contextmanager
+def _borrow_conn():
+    """Borrow a pooled database connection for the duration of a with-block"""
+    conn = get_db_connection()
+    try:
+        yield conn
+    finally:
+        release_db_connection(conn)
+
+def execute_sql_query(sql_query, conn=None):
+    """Execute SQL query
+
+    conn: optional connection borrowed by the caller (see _borrow_conn), so several
+    queries in one request share a handle; otherwise one is borrowed from the pool.
+    """
     if not pyodbc:
         raise Exception("pyodbc not available")
 
+    if conn is None:
+        with _borrow_conn() as conn:
+            return execute_sql_query(sql_query, conn)
+
     start_time = time.time()
     log_debug(f"[SQL] Executing query...")
     
     try:
-        conn = get_db_connection() 
         cursor = conn.cursor()
         cursor.execute(sql_query)
+        results = _fetch_rows(cursor)
+        cursor.close()
         
-        columns = [column[0] for column in cursor.description]
-        results = []
+        elapsed = time.time() - start_time
+        log_debug(f"[SQL] Query completed in {elapsed:.2f}s, returned {len(results)} rows")
         
-        for row in cursor.fetchall():
-            row_dict = {}
-            for i, column in enumerate(columns):
-                value = row[i]
-                if isinstance(value, datetime):
-                    row_dict[column] = value.strftime('%Y-%m-%d %H:%M:%S')
-                else:
-                    row_dict[column] = value
-            results.append(row_dict)
+        return results
+    except Exception as e:
+        log_debug(f"[SQL] [ERROR] {str(e)}")
+        raise Exception(f"Database error: {str(e)}")
+
+def execute_sql_queries_multi(queries, conn=None):
+    """Execute several SELECT statements as one batch (a single round trip)
+
+    Returns one list of row dicts per query, in order. Statements that produce
+    no result set (e.g. SET NOCOUNT ON) are skipped when walking the results.
+    """
+    if not pyodbc:
+        raise Exception("pyodbc not available")
+
+    if conn is None:
+        with _borrow_conn() as conn:
+            return execute_sql_queries_multi(queries, conn)
+
+    start_time = time.time()
+    log_debug(f"[SQL] Executing batch of {len(queries)} queries...")
+    
+    try:
+        cursor = conn.cursor()
+        cursor.execute(";\n".join(queries))
         
+        results = []
+        while True:
+            if cursor.description is not None:
+                results.append(_fetch_rows(cursor))
+            if not cursor.nextset():
+                break
         cursor.close()
-        conn.close()
+        
+        if len(results) != len(queries):
+            raise Exception(f"Expected {len(queries)} result sets, got {len(results)}")
         
         elapsed = time.time() - start_time
-        log_debug(f"[SQL] Query completed in {elapsed:.2f}s, returned {len(results)} rows")
+        log_debug(f"[SQL] Batch completed in {elapsed:.2f}s, returned {[len(r) for r in results]} rows")
         
         return results
     except Exception as e:
         log_debug(f"[SQL] [ERROR] {str(e)}")
         raise Exception(f"Database error: {str(e)}")
 
+# Rows requested per fetchmany() call
+SQL_FETCH_BATCH = 1000
+
+def _fetch_rows(cursor):
+    """Fetch the cursor's current result set as a list of dicts"""
+    columns = [column[0] for column in cursor.description]
+    # pyodbc reports the Python type as type_code; only these columns need formatting
+    datetime_cols = [column[0] for column in cursor.description if column[1] is datetime]
+    
+    results = []
+    
+    # Fetch in batches: the driver never holds the whole result set as one list of rows
+    while True:
+        rows = cursor.fetchmany(SQL_FETCH_BATCH)
+        if not rows:
+            break
+        for row in rows:
+            row_dict = dict(zip(columns, row))
+            for column in datetime_cols:
+                value = row_dict[column]
+                if value is not None:
+                    row_dict[column] = value.strftime('%Y-%m-%d %H:%M:%S')
+            results.append(row_dict)
+    
+    return results
+
+# PDFs/images above this size are treated as heavy (multi-page scans to OCR)
+LARGE_FILE_BYTES = 5 * 1024 * 1024
+
+def file_job_limit(file_docs, base_path):
+    """Number of file jobs to run at once for this request
+
+    Two small files share a slot and a large PDF/image gets two, capped at the
+    extraction process count: a few big scans should not oversubscribe the OCR
+    engine, while a batch of small documents still runs in parallel. The cap also
+    leaves scheduler threads free for HTML conversion.
+    """
+    from extractors.file_processor import get_file_extension, CPU_BOUND_EXTENSIONS, MAX_EXTRACTION_PROCESSES
+    
+    small = large = 0
+    for doc in file_docs:
+        filename = doc['content'] or ''
+        size = 0
+        if get_file_extension(filename) in CPU_BOUND_EXTENSIONS:
+            try:
+                size = os.path.getsize(os.path.join(base_path, filename))
+            except (OSError, ValueError):
+                pass
+        if size > LARGE_FILE_BYTES:
+            large += 1
+        else:
+            small += 1
+    
+    return max(1, min(MAX_EXTRACTION_PROCESSES, -(-small // 2) + 2 * large, len(file_docs)))
+
+# Short values with at most this many tags are journal-style plain text with a stray
+# tag or two; stripping the tags gives the parser's result without running the parser
+PLAIN_TEXT_MAX_CHARS = 2048
+PLAIN_TEXT_MAX_TAGS = 2
+# Only '<' followed by a letter, '/' or '!' opens a tag, as in the HTML tokenizer, so
+# clinical text such as "värde <140 och >90" is kept
+_TAG_RE = re.compile(r'<[A-Za-z/!][^>]*>')
+# Entities, comments and script/style bodies need the real parser
+_NEEDS_PARSER_RE = re.compile(r'&|<!--|<(?:script|style)\b', re.IGNORECASE)
+_WS_RE = re.compile(r'\s+')
+
+def _maybe_html_to_text(content):
+    """html_to_text, skipping the HTML parser for short, nearly tag-free content"""
+    if len(content) > PLAIN_TEXT_MAX_CHARS or content.count('<') > PLAIN_TEXT_MAX_TAGS \
+            or _NEEDS_PARSER_RE.search(content):
+        return html_to_text(content)
+    return _WS_RE.sub(' ', _TAG_RE.sub(' ', content)).strip()
+
+def process_single_html(doc):
+    """Convert a single HTML document to text"""
+    clean_text = _maybe_html_to_text(doc['content'])
+    # html_to_text collapses all whitespace to single spaces, so counting them is exact
+    word_count = clean_text.count(' ') + 1 if clean_text else 0
+    text_info = get_text_summary_info(clean_text, word_count)
+    log_debug(f"[HTML_PROCESS] {doc['name']} - {text_info['word_count']} words")
+    return {
+        'success': True,
+        'name': doc['name'],
+        'text': clean_text,
+        'created_date': doc['created_date'],
+        'signed_date': doc['signed_date'],
+        'source_type': 'html',
+        'document_type': doc['type'],
+        'text_info': text_info
+    }
+
+def _warm_file_processing():
+    """Import the file extractors (runs while the SQL is in flight)"""
+    import extractors.file_processor
+
 def process_single_file(doc, base_path, ocr_language):
     """Process a single file document"""
     try:
+        from extractors.file_processor import process_file_in_pool
+        
         log_debug(f"[FILE_PROCESS] Processing file: {doc['name']}")
-        result = process_file(
+        # PDFs and images are extracted in the shared process pool (no GIL contention)
+        result = process_file_in_pool(
             filename=doc['content'],
             base_path=base_path,
             ocr_language=ocr_language,
@@ -187,14 +396,15 @@ def process_single_file(doc, base_path, ocr_language):
         )
         
         if result['success']:
-            text_info = get_text_summary_info(result['text'])
+            # process_file has already counted the words while logging the extraction
+            text_info = get_text_summary_info(result['text'], result.get('word_count'))
             log_debug(f"[FILE_PROCESS] Success: {doc['name']} - {text_info['word_count']} words")
             return {
                 'success': True,
                 'name': doc['name'],
                 'text': result['text'],
-                'created_date': doc['record'].get('CreatedDate', 'N/A'),
-                'signed_date': doc['record'].get('SignedDate', 'N/A'),
+                'created_date': doc['created_date'],
+                'signed_date': doc['signed_date'],
                 'source_type': 'file',
                 'document_type': doc['type'],
                 'file_type': result['file_type'],
@@ -209,6 +419,37 @@ def process_single_file(doc, base_path, ocr_language):
         return {'success': False}
 
 
+# Bullet texts that indicate empty/missing content, case-folded once at load so a
+# bullet needs a single strip().casefold() and one set lookup
+_PLACEHOLDER_TEXTS = frozenset(text.casefold() for text in (
+    '', 
+    'information saknas', 
+    'information missing',
+    'information saknas i dokumenten',
+    'ingen information', 
+    'no information', 
+    'saknas', 
+    'missing',
+    'n/a', 
+    'none', 
+    'nej', 
+    'no'
+))
+
+
+def filter_template_sections(section_bullets, section_names):
+    """Keep only the sections that exist in the template (logs the ones removed)"""
+    template_sections = set(section_names)
+    for bullet_section in section_bullets.keys() - template_sections:
+        log_debug(f"[FILTER] Removed non-template section: '{bullet_section}'")
+    return {section: bullets for section, bullets in section_bullets.items() if section in template_sections}
+
+
+def _normalize_section_name(name):
+    """Case-folded section name with whitespace runs collapsed, for comparisons"""
+    return ' '.join(name.casefold().split())
+
+
 def find_unmapped_sections(template_sections, mapped_sections):
     """
     Find template sections that were not mapped or have placeholder content
@@ -222,48 +463,31 @@ def find_unmapped_sections(template_sections, mapped_sections):
     """
     unmapped = []
     
-    # Define placeholder texts that indicate empty/missing content
-    placeholder_texts = [
-        '', 
-        'information saknas', 
-        'information missing',
-        'information saknas i dokumenten',
-        'ingen information', 
-        'no information', 
-        'saknas', 
-        'missing',
-        'n/a', 
-        'none', 
-        'nej', 
-        'no'
-    ]
+    # Normalize every mapped section name once; exact matches are then a dict lookup
+    normalized_mapped = {}
+    for mapped_section, bullets in mapped_sections.items():
+        normalized_mapped.setdefault(_normalize_section_name(mapped_section), bullets)
     
     for template_section in template_sections:
         # Normalize for comparison
-        template_normalized = re.sub(r'\s+', ' ', template_section.lower().strip())
+        template_normalized = _normalize_section_name(template_section)
         
         # Check if this section exists in mapped_sections
-        found = False
-        has_real_content = False
+        found = template_normalized in normalized_mapped
+        if found:
+            bullets = normalized_mapped[template_normalized]
+        else:
+            # Fall back to a partial match in either direction
+            for mapped_normalized, bullets in normalized_mapped.items():
+                if template_normalized in mapped_normalized or mapped_normalized in template_normalized:
+                    found = True
+                    break
         
-        for mapped_section, bullets in mapped_sections.items():
-            mapped_normalized = re.sub(r'\s+', ' ', mapped_section.lower().strip())
-            
-            # Check if this is a match
-            if template_normalized == mapped_normalized or \
-               template_normalized in mapped_normalized or \
-               mapped_normalized in template_normalized:
-                found = True
-                
-                # Check if bullets have real content (not just placeholders)
-                if bullets:
-                    for bullet in bullets:
-                        bullet_text = str(bullet).strip().lower()
-                        if bullet_text and bullet_text not in placeholder_texts:
-                            has_real_content = True
-                            break
-                
-                break
+        # Check if bullets have real content (not just placeholders); any() stops at the
+        # first real bullet, and '' is itself a placeholder so blank bullets need no extra test
+        has_real_content = found and bool(bullets) and any(
+            str(bullet).strip().casefold() not in _PLACEHOLDER_TEXTS for bullet in bullets
+        )
         
         # Section needs content if:
         # 1. Not found in mapped sections at all, OR
@@ -280,7 +504,9 @@ def find_unmapped_sections(template_sections, mapped_sections):
     return unmapped
 
 
-def main():
+def handle_request(environ, stream):
+    """Run one request; always ends by raising _Halt through return_json"""
+    db_conn = None
     try:
         log_debug("="*70)
         log_debug("[START] AI Summary API Request")
@@ -293,7 +519,7 @@ def main():
         log_debug("[START] Imports successful")
         
         # Read POST data
-        data = read_post_data()
+        data = read_post_data(environ, stream)
         
         # Extract parameters
         user_id = data.get('user_id')
@@ -309,7 +535,7 @@ def main():
         journal_doc_ids = data.get('journal_doc_ids', None)
         internal_doc_id = data.get('internal_doc_id', None)
         
-        ip_address = os.environ.get('REMOTE_ADDR', '0.0.0.0')
+        ip_address = environ.get('REMOTE_ADDR', '0.0.0.0')
         cust_code = data.get('cust_code')
         report_type = data.get('report_type', 'SlutReport')
         client_name = data.get('client_name', None)
@@ -335,7 +561,26 @@ def main():
         
         # Execute SQL
         log_debug("[STEP 1] Executing SQL query")
-        db_results = execute_sql_query(sql_query)
+        # One pooled connection serves both the document and the template query
+        db_conn = get_db_connection()
+        template_results = None
+        if doc_template_query:
+            # The template does not depend on the documents: fetch both in one round trip
+            sql_future = _GLOBAL_POOL.submit(execute_sql_queries_multi, [sql_query, doc_template_query], db_conn)
+        else:
+            sql_future = _GLOBAL_POOL.submit(execute_sql_query, sql_query, db_conn)
+        # Import the extractors while the database round trip is in flight
+        warm_future = _GLOBAL_POOL.submit(_warm_file_processing)
+        
+        if doc_template_query:
+            db_results, template_results = sql_future.result()
+        else:
+            db_results = sql_future.result()
+        
+        try:
+            warm_future.result()
+        except Exception as e:
+            log_debug(f"[WARNING] File processing warm-up failed: {e}")
         
         if not db_results:
             log_debug("[RESULT] No documents found")
@@ -349,72 +594,78 @@ def main():
         
         # Process documents
         log_debug("[STEP 2] Processing documents")
-        processed_documents = []
         html_docs = []
         file_docs = []
         
         for idx, record in enumerate(db_results, 1):
-            doc_content = record.get('DocumentContent', '')
-            doc_name = record.get('DocumentName', f'Document {idx}')
-            doc_type = record.get('DocumentType', 'internal')
+            # Every field the processors need is read here, once per row
+            rget = record.get
+            doc_content = rget('DocumentContent', '')
+            is_html = is_html_content(doc_content)
             
-            if is_html_content(doc_content):
-                html_docs.append({
-                    'index': idx, 'name': doc_name, 'content': doc_content, 
-                    'record': record, 'type': doc_type
-                })
-            else:
-                file_docs.append({
-                    'index': idx, 'name': doc_name, 'content': doc_content,
-                    'record': record, 'type': doc_type
-                })
+            (html_docs if is_html else file_docs).append({
+                'index': idx,
+                'name': rget('DocumentName', f'Document {idx}'),
+                'content': doc_content,
+                'type': rget('DocumentType', 'internal'),
+                'created_date': rget('CreatedDate', 'N/A'),
+                'signed_date': rget('SignedDate', 'N/A'),
+                'is_html': is_html
+            })
         
         log_debug(f"[STEP 2] HTML docs: {len(html_docs)}, File docs: {len(file_docs)}")
         
-        # Process HTML documents
-        if html_docs:
-            log_debug(f"[STEP 2A] Converting {len(html_docs)} HTML documents")
-            for doc in html_docs:
-                clean_text = html_to_text(doc['content'])
-                text_info = get_text_summary_info(clean_text)
-                processed_documents.append({
-                    'name': doc['name'],
-                    'text': clean_text,
-                    'created_date': doc['record'].get('CreatedDate', 'N/A'),
-                    'signed_date': doc['record'].get('SignedDate', 'N/A'),
-                    'source_type': 'html',
-                    'document_type': doc['type'],
-                    'text_info': text_info
-                })
-                log_debug(f"[HTML_PROCESS] {doc['name']} - {text_info['word_count']} words")
+        # HTML conversion and file extraction share the scheduler and one drain loop, so
+        # HTML parsing overlaps with file I/O and OCR instead of running before it
+        from extractors.file_processor import get_scheduler, warm_up_process_pool
+        
+        scheduler = get_scheduler()
+        future_to_doc = {}
+        results_by_index = {}
         
         # ===== FILE DOCUMENTS PROCESSING =====
+        # Queue files grouped by extension so each thread runs same-type extractions back to
+        # back (warm extractor code and OCR APIs in the workers); results are re-ordered below anyway
+        queued_files = iter(sorted(file_docs, key=lambda doc: os.path.splitext(doc['content'] or '')[1].lower()))
+        
+        def submit_next_file():
+            doc = next(queued_files, None)
+            if doc is not None:
+                future_to_doc[scheduler.submit(process_single_file, doc, base_path, ocr_language)] = doc
+        
         if file_docs:
             log_debug(f"[STEP 2B] Processing {len(file_docs)} file documents")
             
-            with ThreadPoolExecutor(max_workers=4) as executor:
-                future_to_doc = {
-                    executor.submit(process_single_file, doc, base_path, ocr_language): doc 
-                    for doc in file_docs
-                }
-                
-                for future in as_completed(future_to_doc):
-                    result = future.result()
-                    if result['success']:
-                        processed_documents.append({
-                            'name': result['name'],
-                            'text': result['text'],
-                            'created_date': result['created_date'],
-                            'signed_date': result['signed_date'],
-                            'source_type': result['source_type'],
-                            'document_type': result['document_type'],
-                            'file_type': result['file_type'],
-                            'extraction_method': result['extraction_method'],
-                            'text_info': result['text_info']
-                        })
+            job_limit = file_job_limit(file_docs, base_path)
+            log_debug(f"[STEP 2B] Running up to {job_limit} file jobs at a time")
+            # Extraction processes start (and load OCR) while the HTML documents convert below
+            warm_up_process_pool(ocr_language, job_limit)
+            for _ in range(job_limit):
+                submit_next_file()
+        
+        # Submitted after the first file jobs, so extraction processes start working
+        # before the scheduler threads are busy converting HTML
+        if html_docs:
+            log_debug(f"[STEP 2A] Converting {len(html_docs)} HTML documents")
+            for doc in html_docs:
+                future_to_doc[scheduler.submit(process_single_html, doc)] = doc
+        
+        while future_to_doc:
+            done, _ = wait(future_to_doc, return_when=FIRST_COMPLETED)
+            for future in done:
+                doc = future_to_doc.pop(future)
+                if not doc['is_html']:
+                    submit_next_file()
+                result = future.result()
+                if result.pop('success'):
+                    results_by_index[doc['index']] = result
+                    if not doc['is_html']:
                         log_debug(f"[FILE_SUCCESS] {result['name']} - {result['text_info']['word_count']} words")
-                    else:
-                        log_debug(f"[FILE_FAILED] {future_to_doc[future]['name']}")
+                else:
+                    log_debug(f"[FILE_FAILED] {doc['name']}")
+        
+        # Documents keep their database order regardless of which finished first
+        processed_documents = [results_by_index[index] for index in sorted(results_by_index)]
         
         log_debug(f"[STEP 2] Processed {len(processed_documents)} documents total")
         
@@ -426,7 +677,6 @@ def main():
         if doc_template_query:
             log_debug("[MODE] TEMPLATE MODE REQUESTED")
             
-            template_results = execute_sql_query(doc_template_query)
             if not template_results:
                 log_debug("[ERROR] Template not found")
                 return_json({"success": False, "error": "Template not found"}, 404)
@@ -443,7 +693,7 @@ def main():
                 # Use MONTHLY files
                 from utils.template_analyzer_monthly import analyze_monthly_template
                 from utils.template_mapper_monthly import map_monthly_bullets
-                from utils.openai_summarizer_with_template_monthly import generate_monthly_summaries
+                from utils.openai_summarizer_with_template_monthly import generate_monthly_summaries, generate_content_for_unmapped_monthly_sections
                 
                 template_structure = analyze_monthly_template(template_html)
                 section_names = [s['name'] for s in template_structure['sections']]
@@ -474,18 +724,8 @@ def main():
                     )
                     
                     section_bullets = ai_result['section_bullets']
-                    # New code
                     # FILTER: Remove any sections not in template
-                    filtered_bullets = {}
-                    for bullet_section, bullets in section_bullets.items():
-                        # Check if this section exists in template
-                        if bullet_section in section_names:
-                            filtered_bullets[bullet_section] = bullets
-                        else:
-                            log_debug(f"[FILTER] Removed non-template section: '{bullet_section}'")
-
-                    section_bullets = filtered_bullets
-                    # New code end
+                    section_bullets = filter_template_sections(section_bullets, section_names)
                     
                     # Check for unmapped sections
                     log_debug(f"[STEP 4.5] Checking for unmapped MONTHLY sections")
@@ -493,7 +733,6 @@ def main():
                     
                     if unmapped_sections:
                         log_debug(f"[STEP 4.5] Found {len(unmapped_sections)} unmapped MONTHLY sections")
-                        from utils.openai_summarizer_with_template_monthly import generate_content_for_unmapped_monthly_sections
                         
                         unmapped_result = generate_content_for_unmapped_monthly_sections(
                             unmapped_sections=unmapped_sections,
@@ -567,6 +806,9 @@ def main():
             # ===== ADD THIS NEW VÅRDPLAN BLOCK HERE =====
             elif report_type == "Genomförandeplan":
                 log_debug("[MODE] VÅRDPLAN/Genomförandeplan TEMPLATE MODE")
+                from utils.template_analyzer_vardplan import analyze_vardplan_template
+                from utils.template_mapper_vardplan import map_vardplan_bullets
+                from utils.content_summarizer_vardplan import summarize_vardplan_content
                 
                 # Analyze template
                 template_structure = analyze_vardplan_template(template_html)
@@ -579,12 +821,15 @@ def main():
                 else:
                     log_debug(f"[STEP 4] Generating VÅRDPLAN summaries for {len(section_names)} sections")
                     
+                    # Built once; the unmapped-section call below reuses the same list
+                    journal_entries = [{
+                        'content': doc['text'],
+                        'date': doc.get('created_date', 'Unknown')
+                    } for doc in processed_documents]
+                    
                     # Generate summaries (NOW RETURNS FULL RESULT WITH STATS)
                     ai_result = summarize_vardplan_content(
-                        journal_entries=[{
-                            'content': doc['text'],
-                            'date': doc.get('created_date', 'Unknown')
-                        } for doc in processed_documents],
+                        journal_entries=journal_entries,
                         template_sections=section_names,
                         model=openai_model,
                         max_tokens=max_tokens,
@@ -599,18 +844,8 @@ def main():
                     )
                     
                     section_bullets = ai_result['section_bullets']
-                    # New code
                     # FILTER: Remove any sections not in template
-                    filtered_bullets = {}
-                    for bullet_section, bullets in section_bullets.items():
-                        # Check if this section exists in template
-                        if bullet_section in section_names:
-                            filtered_bullets[bullet_section] = bullets
-                        else:
-                            log_debug(f"[FILTER] Removed non-template section: '{bullet_section}'")
-
-                    section_bullets = filtered_bullets
-                    # New code end
+                    section_bullets = filter_template_sections(section_bullets, section_names)
                     
                     # Check for unmapped sections
                     log_debug(f"[STEP 4.5] Checking for unmapped VÅRDPLAN sections")
@@ -621,10 +856,7 @@ def main():
                         
                         # Generate content for unmapped sections
                         unmapped_result = summarize_vardplan_content(
-                            journal_entries=[{
-                                'content': doc['text'],
-                                'date': doc.get('created_date', 'Unknown')
-                            } for doc in processed_documents],
+                            journal_entries=journal_entries,
                             template_sections=unmapped_sections,
                             model=openai_model,
                             max_tokens=max_tokens,
@@ -731,18 +963,8 @@ def main():
                     )
                     
                     section_bullets = ai_result['section_bullets']
-                    # New code
                     # FILTER: Remove any sections not in template
-                    filtered_bullets = {}
-                    for bullet_section, bullets in section_bullets.items():
-                        # Check if this section exists in template
-                        if bullet_section in section_names:
-                            filtered_bullets[bullet_section] = bullets
-                        else:
-                            log_debug(f"[FILTER] Removed non-template section: '{bullet_section}'")
-
-                    section_bullets = filtered_bullets
-                    # New code end
+                    section_bullets = filter_template_sections(section_bullets, section_names)
                     log_debug(f"[STEP 4] AI returned {len(section_bullets)} sections")
                     log_debug(f"[STEP 4] Sections returned: {list(section_bullets.keys())}")
                     
@@ -841,6 +1063,7 @@ def main():
         
         if not doc_template_query:
             log_debug("[MODE] BULLET MODE - Dynamic Headers")
+            from openai_summarizer_bullets import process_documents_bullets
 
             analysis_results = process_documents_bullets(
                 processed_documents,
@@ -893,6 +1116,45 @@ def main():
         import traceback
         log_debug(f"[TRACEBACK]\n{traceback.format_exc()}")
         return_json({"success": False, "error": "Internal server error"}, 500)
+    finally:
+        if db_conn is not None:
+            release_db_connection(db_conn)
+
+
+def _run(environ, stream):
+    """Run handle_request and return the _Halt carrying its response"""
+    try:
+        handle_request(environ, stream)
+    except _Halt as halt:
+        return halt
+    # Every path ends in return_json; reaching here means a branch forgot to respond
+    log_debug("[FATAL ERROR] Request finished without a response")
+    try:
+        return_json({"success": False, "error": "Internal server error"}, 500)
+    except _Halt as halt:
+        return halt
+
+
+def main():
+    """CGI entry point: one request per process"""
+    _write_cgi_response(_run(os.environ, sys.stdin.buffer))
+    sys.exit(0)
+
+
+def application(environ, start_response):
+    """
+    WSGI entry point (wfastcgi / HttpPlatformHandler on IIS)
+    
+    The Python process outlives the request, so imports, the database connection
+    pool, the scheduler threads and the loaded OCR model are reused by later requests.
+    """
+    halt = _run(environ, environ['wsgi.input'])
+    start_response(halt.status, [
+        ('Content-Type', 'application/json; charset=utf-8'),
+        ('Content-Length', str(len(halt.body))),
+    ])
+    log_debug(f"[RESPONSE] JSON sent successfully")
+    return [halt.body]
 
 
 if __name__ == '__main__':
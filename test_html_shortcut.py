@@ -0,0 +1,50 @@
+# test_html_shortcut.py
+"""
+Tests for _maybe_html_to_text: plain text and light markup skip the HTML parser,
+anything it would handle differently goes through html_to_text
+"""
+
+import pytest
+
+pytest.importorskip("utils.config")
+pytest.importorskip("pyodbc", exc_type=ImportError)  # Needs the ODBC driver manager
+
+import test_d
+from test_d import _maybe_html_to_text
+
+
+@pytest.fixture
+def parser_calls(monkeypatch):
+    calls = []
+    
+    def fake_html_to_text(content):
+        calls.append(content)
+        return "PARSED"
+    
+    monkeypatch.setattr(test_d, "html_to_text", fake_html_to_text)
+    return calls
+
+
+def test_plain_text_keeps_comparisons(parser_calls):
+    assert _maybe_html_to_text("Blodtryck  <140 och >90\n mmHg") == "Blodtryck <140 och >90 mmHg"
+    assert _maybe_html_to_text("a<b och c < d") == "a<b och c < d"
+    assert parser_calls == []
+
+
+def test_light_markup_is_stripped(parser_calls):
+    assert _maybe_html_to_text("<p>Hej</p>värld") == "Hej värld"
+    assert _maybe_html_to_text("rad<br/>rad") == "rad rad"
+    assert parser_calls == []
+
+
+@pytest.mark.parametrize("content", [
+    "Tom &amp; Jerry",
+    "<!-- kommentar -->text",
+    "<script>var x = 1;</script>",
+    "<STYLE>p {}</STYLE>",
+    "<b>en</b> <i>två</i>",
+    "x" * (test_d.PLAIN_TEXT_MAX_CHARS + 1),
+])
+def test_falls_back_to_parser(parser_calls, content):
+    assert _maybe_html_to_text(content) == "PARSED"
+    assert parser_calls == [content]
@@ -0,0 +1,73 @@
+# test_pdf_hybrid.py
+"""
+Tests for the hybrid PDF extractor: per-page choice between the text layer and OCR
+"""
+
+import pytest
+
+pymupdf = pytest.importorskip("pymupdf")
+
+from extractors import pdf_extractor
+from extractors.pdf_extractor import _classify_page, _extract_hybrid, MIN_PAGE_TEXT_CHARS
+
+LONG_TEXT = "Beskrivning av placeringen och barnets situation i familjehemmet."
+
+
+def test_classify_page():
+    assert len(LONG_TEXT) > MIN_PAGE_TEXT_CHARS
+    assert _classify_page(LONG_TEXT, has_images=True, try_ocr=True) == 'text'
+    assert _classify_page("", has_images=True, try_ocr=True) == 'ocr'
+    assert _classify_page("Sida 4", has_images=True, try_ocr=True) == 'ocr'
+    # Without images or with OCR disabled, near-empty pages keep their text or are skipped
+    assert _classify_page("Sida 4", has_images=False, try_ocr=True) == 'text'
+    assert _classify_page("Sida 4", has_images=True, try_ocr=False) == 'text'
+    assert _classify_page("  \n", has_images=False, try_ocr=True) == 'skip'
+    assert _classify_page("", has_images=True, try_ocr=False) == 'skip'
+
+
+@pytest.fixture
+def mixed_pdf(tmp_path):
+    """Pages: text layer / blank / image only / short text"""
+    pixmap = pymupdf.Pixmap(pymupdf.csGRAY, pymupdf.IRect(0, 0, 20, 20), False)
+    pixmap.clear_with(255)
+    pdf = pymupdf.open()
+    pdf.new_page().insert_text((72, 72), LONG_TEXT)
+    pdf.new_page()
+    pdf.new_page().insert_image(pymupdf.Rect(72, 72, 272, 272), pixmap=pixmap)
+    pdf.new_page().insert_text((72, 72), "Sida 4")
+    path = tmp_path / "mixed.pdf"
+    pdf.save(str(path))
+    pdf.close()
+    return str(path)
+
+
+@pytest.fixture
+def ocr_calls(monkeypatch):
+    calls = []
+    
+    def fake_ocr(pixmap, lang):
+        calls.append(lang)
+        return "OCR TEXT"
+    
+    monkeypatch.setattr(pdf_extractor, "_ocr_pixmap", fake_ocr)
+    return calls
+
+
+def test_extract_hybrid_ocrs_only_image_pages(mixed_pdf, ocr_calls):
+    text, text_pages, ocr_pages = _extract_hybrid(mixed_pdf, 'swe')
+    
+    assert (text_pages, ocr_pages) == (2, 1)
+    assert ocr_calls == ['swe']
+    assert "--- Page 1 ---\n" + LONG_TEXT in text
+    assert "--- Page 2 ---" not in text
+    assert "--- Page 3 ---\nOCR TEXT" in text
+    assert "--- Page 4 ---\nSida 4" in text
+    assert text.index("Page 1") < text.index("Page 3") < text.index("Page 4")
+
+
+def test_extract_hybrid_without_ocr(mixed_pdf, ocr_calls):
+    text, text_pages, ocr_pages = _extract_hybrid(mixed_pdf, 'swe', try_ocr=False)
+    
+    assert (text_pages, ocr_pages) == (2, 0)
+    assert ocr_calls == []
+    assert "--- Page 3 ---" not in text
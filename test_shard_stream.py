@@ -0,0 +1,106 @@
+# test_shard_stream.py
+"""
+Tests for streamed shard summaries: incremental section parsing and the retry rules
+of _summarize_shard (no retry once sections have been passed on)
+"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("utils.config")
+pytest.importorskip("pyodbc", exc_type=ImportError)  # Needs the ODBC driver manager
+
+import httpx
+import openai
+
+import openai_summarizer_bullets as bullets
+from openai_summarizer_bullets import _SectionStream, _summarize_shard, RateLimiter
+
+SECTIONS = [
+    {"header": "HÄLSA", "bullets": ["Mår bra {ok}"]},
+    {"header": "SKOLA", "bullets": ["Går i årskurs 5"]},
+]
+RESPONSE_TEXT = json.dumps({"sections": SECTIONS}, ensure_ascii=False)
+REQUEST = {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": "x"}], "max_tokens": 10}
+
+
+def _feed_all(text, size):
+    stream = _SectionStream()
+    found = []
+    for start in range(0, len(text), size):
+        found.extend(stream.feed(text[start:start + size]))
+    return found
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, len(RESPONSE_TEXT)])
+def test_section_stream_any_chunking(size):
+    assert _feed_all(RESPONSE_TEXT, size) == SECTIONS
+
+
+def test_section_stream_emits_each_section_once_complete():
+    stream = _SectionStream()
+    first_end = RESPONSE_TEXT.index("]}") + 2
+    assert stream.feed(RESPONSE_TEXT[:first_end - 1]) == []
+    assert stream.feed(RESPONSE_TEXT[first_end - 1:first_end]) == [SECTIONS[0]]
+    assert stream.feed(RESPONSE_TEXT[first_end:]) == [SECTIONS[1]]
+
+
+class FakeCompletions:
+    """Streams RESPONSE_TEXT; the first call drops the connection after fail_after chars"""
+    
+    def __init__(self, fail_after):
+        self.fail_after = fail_after
+        self.calls = 0
+    
+    async def create(self, **kwargs):
+        self.calls += 1
+        failing = self.calls == 1
+        
+        async def chunks():
+            for start in range(0, len(RESPONSE_TEXT), 5):
+                if failing and start >= self.fail_after:
+                    raise openai.APIConnectionError(request=httpx.Request("POST", "http://test"))
+                delta = SimpleNamespace(content=RESPONSE_TEXT[start:start + 5], refusal=None)
+                yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=delta)])
+            usage = SimpleNamespace(prompt_tokens=1, completion_tokens=1, total_tokens=2)
+            yield SimpleNamespace(usage=usage, choices=[])
+        
+        return chunks()
+
+
+def _run_shard(monkeypatch, fail_after):
+    monkeypatch.setattr(bullets, "RETRY_MIN_WAIT", 0)
+    monkeypatch.setattr(bullets, "RETRY_MAX_WAIT", 0)
+    completions = FakeCompletions(fail_after)
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    client.with_options = lambda **kwargs: client
+    emitted = []
+    
+    async def run():
+        return await _summarize_shard(
+            client, asyncio.Semaphore(1), RateLimiter(10 ** 6, 10 ** 6), REQUEST, emitted.append
+        )
+    
+    return completions, emitted, run
+
+
+def test_retries_when_nothing_was_emitted(monkeypatch):
+    completions, emitted, run = _run_shard(monkeypatch, fail_after=5)
+    sections, usage = asyncio.run(run())
+    
+    assert completions.calls == 2
+    assert sections == SECTIONS
+    assert emitted == SECTIONS
+    assert usage.total_tokens == 2
+
+
+def test_no_retry_after_a_section_was_emitted(monkeypatch):
+    completions, emitted, run = _run_shard(monkeypatch, fail_after=RESPONSE_TEXT.index("SKOLA"))
+    with pytest.raises(openai.APIConnectionError):
+        asyncio.run(run())
+    
+    assert completions.calls == 1
+    assert emitted == SECTIONS[:1]
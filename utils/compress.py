@@ -0,0 +1,107 @@
+# utils/compress.py
+"""
+Document Text Compression
+Rule-based cleanup of extracted document text before it is sent to the LLM.
+Removes layout noise (page markers, repeated lines, runs of spaces/blank lines)
+so more of the per-document budget is spent on actual content, and truncates
+text to a token budget (exact with tiktoken, estimated without it).
+"""
+
+import re
+from functools import lru_cache
+from itertools import groupby
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Without tiktoken, token budgets are approximated as this many characters per token
+CHARS_PER_TOKEN = 4
+
+_SPACES_RE = re.compile(r'[ \t\xa0]{2,}')
+# Page markers written by the PDF extractors ("--- Page 3 ---") and "N of/av M" page
+# footers ("3 av 5", "Page 3 of 5", "Sida 3 av 5"). Bare "Sida 2" or "12 (3)" lines are
+# kept: they can be headings or table rows.
+_PAGE_LINE_RE = re.compile(
+    r'^(?:-{3} Page \d+ -{3}|(?:(?:page|sida)\s+)?\d+\s+(?:of|av)\s+\d+)$',
+    re.IGNORECASE
+)
+
+
+def compress_doc_text(text, max_chars=8000):
+    """
+    Strip layout noise from document text and cap its length
+
+    Args:
+        text (str): Extracted document text
+        max_chars (int): Maximum characters to keep (None for no limit)
+
+    Returns:
+        str: Compressed text
+    """
+    if not text:
+        return ""
+
+    text = _SPACES_RE.sub(' ', text)
+
+    lines = (line.strip() for line in text.split('\n'))
+    lines = (line for line in lines if not _PAGE_LINE_RE.match(line))
+    # Drop consecutive duplicate lines (repeated headers, table borders, etc.); this also
+    # collapses runs of blank lines to one
+    text = '\n'.join(line for line, _ in groupby(lines)).strip()
+
+    if max_chars is not None:
+        text = text[:max_chars]
+    return text
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model):
+    """tiktoken encoding for a model (o200k_base for models tiktoken does not know)"""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding('o200k_base')
+
+
+def truncate_to_tokens(text, max_tokens, model='gpt-4o-mini'):
+    """
+    Cut text to at most max_tokens tokens of the model's tokenizer
+
+    Args:
+        text (str): Text to truncate
+        max_tokens (int): Token budget
+        model (str): OpenAI model whose tokenizer is used
+
+    Returns:
+        str: Text that encodes to at most max_tokens tokens
+    """
+    if not text:
+        return ""
+    if tiktoken is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+
+    encoding = _get_encoding(model)
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+def count_tokens(text, model='gpt-4o-mini'):
+    """
+    Number of tokens text encodes to (estimated from its length without tiktoken)
+
+    Args:
+        text (str): Text to measure
+        model (str): OpenAI model whose tokenizer is used
+
+    Returns:
+        int: Token count
+    """
+    if not text:
+        return 0
+    if tiktoken is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(_get_encoding(model).encode(text, disallowed_special=()))
@@ -0,0 +1,217 @@
+# utils/content_cache.py
+"""
+Content Cache
+Key/value cache keyed by SHA-256 content hashes.
+Lets repeated section requests skip OpenAI.
+
+Cached values are derived from patient records, so the cache is conservative:
+- Backend is chosen with Config.CONTENT_CACHE_BACKEND:
+    'memory' (default) - in-process LRU, gone when the process exits
+    'disk'             - SQLite file in Config.CONTENT_CACHE_DIR, shared between processes.
+                         Opt-in only: the directory must be access-controlled (ACL limited
+                         to the app pool identity). There is no TEMP fallback - without
+                         CONTENT_CACHE_DIR the memory backend is used.
+    'off'              - no caching
+- Every entry expires (Config.CONTENT_CACHE_TTL seconds unless cache_set gets a shorter ttl)
+- Size is capped at Config.CONTENT_CACHE_MAX_ENTRIES; the oldest entries are evicted first
+Callers put the client scope (cust_id/client_id) into their keys so entries are never
+shared between clients.
+
+Earlier releases kept an unscoped cache in %TEMP%\\ai_summary_cache.sqlite. Remove it once
+per server when deploying, as the app pool identity so TEMP resolves to the same folder
+(not on every process start):
+    python -m utils.content_cache --purge-legacy
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    from utils.config import Config
+    _conf = Config()
+except ImportError:
+    _conf = None
+
+try:
+    from save_logs import log_debug
+except:
+    def log_debug(msg):
+        pass
+
+
+CACHE_BACKEND = str(getattr(_conf, 'CONTENT_CACHE_BACKEND', 'memory')).lower()
+CACHE_DIR = getattr(_conf, 'CONTENT_CACHE_DIR', None)
+# Upper bound on the lifetime of any entry (seconds)
+DEFAULT_TTL = getattr(_conf, 'CONTENT_CACHE_TTL', 24 * 3600)
+MAX_ENTRIES = getattr(_conf, 'CONTENT_CACHE_MAX_ENTRIES', 500)
+# Disk backend: expired/overflow rows are pruned once every this many writes
+PRUNE_EVERY = 50
+
+if CACHE_BACKEND == 'disk' and not CACHE_DIR:
+    log_debug("[CONTENT_CACHE] [WARNING] Disk backend needs CONTENT_CACHE_DIR; using memory")
+    CACHE_BACKEND = 'memory'
+
+CACHE_FILE = os.path.join(CACHE_DIR, 'ai_summary_cache.sqlite') if CACHE_BACKEND == 'disk' else None
+
+# Earlier releases wrote unscoped entries to a world-readable file in TEMP
+LEGACY_CACHE_FILE = os.path.join(tempfile.gettempdir(), 'ai_summary_cache.sqlite')
+
+# Memory backend: key -> (expires, value), least recently used first
+_memory = OrderedDict()
+_memory_lock = threading.Lock()
+
+# sqlite3 connections may not be shared between threads
+_local = threading.local()
+_writes = 0
+
+
+def purge_legacy_cache():
+    """
+    One-off migration: delete the old TEMP cache file and its WAL files
+
+    Returns:
+        list: Paths that were removed
+    """
+    removed = []
+    if CACHE_FILE == LEGACY_CACHE_FILE:
+        return removed
+    for path in (LEGACY_CACHE_FILE, LEGACY_CACHE_FILE + '-wal', LEGACY_CACHE_FILE + '-shm'):
+        try:
+            os.remove(path)
+            removed.append(path)
+        except OSError:
+            pass
+    return removed
+
+
+def _get_connection():
+    """Return this thread's cache connection, creating the directory and table on first use"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        os.makedirs(CACHE_DIR, mode=0o700, exist_ok=True)
+        conn = sqlite3.connect(CACHE_FILE, timeout=5)
+        try:
+            os.chmod(CACHE_FILE, 0o600)
+        except OSError:
+            pass
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS content_cache ("
+            " cache_key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " expires REAL NOT NULL)"
+        )
+        _local.conn = conn
+    return conn
+
+
+def _prune(conn, now):
+    """Drop expired rows, then the oldest rows beyond MAX_ENTRIES"""
+    conn.execute("DELETE FROM content_cache WHERE expires <= ?", (now,))
+    conn.execute(
+        "DELETE FROM content_cache WHERE cache_key IN ("
+        " SELECT cache_key FROM content_cache ORDER BY created DESC LIMIT -1 OFFSET ?)",
+        (MAX_ENTRIES,)
+    )
+
+
+def content_hash(*parts):
+    """
+    Build a cache key from one or more strings
+
+    Args:
+        *parts: Strings to hash (joined with NUL so boundaries stay unambiguous)
+
+    Returns:
+        str: Hex SHA-256 digest
+    """
+    hasher = hashlib.sha256()
+    for i, part in enumerate(parts):
+        if i:
+            hasher.update(b"\0")
+        hasher.update(str(part).encode('utf-8', 'surrogatepass'))
+    return hasher.hexdigest()
+
+
+def cache_get(key):
+    """
+    Look up a cached value
+
+    Args:
+        key (str): Key from content_hash()
+
+    Returns:
+        Cached (JSON-decoded) value, or None on miss, expiry or error
+    """
+    now = time.time()
+    if CACHE_BACKEND == 'memory':
+        with _memory_lock:
+            entry = _memory.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del _memory[key]
+                return None
+            _memory.move_to_end(key)
+            return json.loads(entry[1])
+    if CACHE_BACKEND != 'disk':
+        return None
+    try:
+        row = _get_connection().execute(
+            "SELECT value FROM content_cache WHERE cache_key = ? AND expires > ?", (key, now)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+    except Exception as e:
+        log_debug(f"[CONTENT_CACHE] [WARNING] Read failed: {e}")
+        return None
+
+
+def cache_set(key, value, ttl=None):
+    """
+    Store a JSON-serializable value (errors are logged and ignored)
+
+    Args:
+        key (str): Key from content_hash()
+        value: JSON-serializable value
+        ttl (float): Lifetime in seconds (capped at DEFAULT_TTL)
+    """
+    global _writes
+    now = time.time()
+    expires = now + min(ttl or DEFAULT_TTL, DEFAULT_TTL)
+    try:
+        data = json.dumps(value, ensure_ascii=False)
+        if CACHE_BACKEND == 'memory':
+            with _memory_lock:
+                _memory[key] = (expires, data)
+                _memory.move_to_end(key)
+                while len(_memory) > MAX_ENTRIES:
+                    _memory.popitem(last=False)
+        elif CACHE_BACKEND == 'disk':
+            conn = _get_connection()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO content_cache (cache_key, value, created, expires)"
+                    " VALUES (?, ?, ?, ?)",
+                    (key, data, now, expires)
+                )
+                _writes += 1
+                if (_writes - 1) % PRUNE_EVERY == 0:
+                    _prune(conn, now)
+    except Exception as e:
+        log_debug(f"[CONTENT_CACHE] [WARNING] Write failed: {e}")
+
+
+if __name__ == '__main__':
+    import sys
+    if '--purge-legacy' in sys.argv[1:]:
+        removed = purge_legacy_cache()
+        print(f"Removed {len(removed)} legacy cache file(s)" + "".join(f"\n  {path}" for path in removed))
+    else:
+        print("Usage: python -m utils.content_cache --purge-legacy")
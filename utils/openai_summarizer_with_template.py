@@ -3,6 +3,7 @@ from openai import OpenAI
 import os
 import json
 import time
+from concurrent.futures import ThreadPoolExecutor
 from db_model import model_pricing, log_to_database
 from utils.config import Config
 
@@ -18,6 +19,18 @@ conf = Config()
 # Initialize OpenAI client
 client = OpenAI(api_key=conf.OPENAI_API_KEY)
 
+# Large templates with small document sets are summarized by concurrent requests over
+# section batches. Every batch re-sends the full document context (input tokens and cost
+# grow with the batch count) and cannot see the other batches' output, so the split is
+# only made when the output is large (many sections) and the re-sent input is small.
+SECTION_BATCH_SIZE = 8
+MAX_SECTION_BATCHES = 3
+SPLIT_MIN_SECTIONS = 16
+# Characters of document text (after the per-document caps) above which one request is used
+SPLIT_MAX_CONTEXT_CHARS = 24000
+# Per-document character caps of the Slutrapport / Månadsrapport prompts
+_DOC_CHARS_CAP = 8000
+
 
 def generate_content_for_unmapped_sections(unmapped_sections, documents, model, max_tokens=2000,
                                            ip_address=None, client_int_doc_ids=None, journal_doc_ids=None,
@@ -217,23 +230,96 @@ def generate_section_specific_summaries(documents, section_names, model, max_tok
     
     # Route to appropriate function based on report type
     if report_type == "Månadsrapport":
-        return generate_monthly_report_summaries(
-            documents, section_names, model, max_tokens, ip_address,
-            client_int_doc_ids, journal_doc_ids, internal_doc_id,
-            client_id, cust_id, user_id, report_type
-        )
+        generate_fn = generate_monthly_report_summaries
     else:
         # Default: Slutrapport (existing functionality)
-        return generate_slutrapport_summaries(
+        generate_fn = generate_slutrapport_summaries
+    
+    context_chars = sum(min(len(doc.get('text', '')), _DOC_CHARS_CAP) for doc in documents)
+    if len(section_names) < SPLIT_MIN_SECTIONS or context_chars > SPLIT_MAX_CONTEXT_CHARS:
+        return generate_fn(
             documents, section_names, model, max_tokens, ip_address,
             client_int_doc_ids, journal_doc_ids, internal_doc_id,
             client_id, cust_id, user_id, report_type
         )
+    
+    def run_batch(batch_sections):
+        # Batches are logged together below as one row
+        try:
+            return generate_fn(
+                documents, batch_sections, model, max_tokens, ip_address,
+                client_int_doc_ids, journal_doc_ids, internal_doc_id,
+                client_id, cust_id, user_id, report_type, log_usage=False
+            )
+        except Exception as e:
+            log_debug(f"[SUMMARIZER] [ERROR] Section batch {batch_sections} failed: {e}")
+            return None
+    
+    # Large templates: output generation dominates latency, so split the sections
+    # into batches and run the requests concurrently (wall time ~ slowest batch)
+    batch_size = max(SECTION_BATCH_SIZE, -(-len(section_names) // MAX_SECTION_BATCHES))
+    batches = [section_names[i:i + batch_size]
+               for i in range(0, len(section_names), batch_size)]
+    log_debug(f"[SUMMARIZER] Splitting {len(section_names)} sections into {len(batches)} concurrent requests "
+              f"(document context is sent {len(batches)}x)")
+    
+    with ThreadPoolExecutor(max_workers=len(batches)) as executor:
+        batch_results = list(executor.map(run_batch, batches))
+    
+    merged = {
+        'section_bullets': {},
+        'tokens': 0,
+        'input_tokens': 0,
+        'output_tokens': 0,
+        'time': 0,
+        'input_cost': 0,
+        'output_cost': 0,
+        'total_cost': 0
+    }
+    api_calls = 0
+    for batch_result in batch_results:
+        # A failed batch only loses its own sections
+        if not isinstance(batch_result, dict):
+            continue
+        merged['section_bullets'].update(batch_result.get('section_bullets') or {})
+        for key in ('tokens', 'input_tokens', 'output_tokens', 'input_cost', 'output_cost', 'total_cost'):
+            merged[key] += batch_result.get(key, 0)
+        merged['time'] = max(merged['time'], batch_result.get('time', 0))
+        if batch_result.get('tokens'):
+            api_calls += 1
+    
+    for key in ('input_cost', 'output_cost', 'total_cost'):
+        merged[key] = round(merged[key], 6)
+    
+    if api_calls:
+        log_to_database({
+            'cid': cust_id,
+            'user_id': user_id,
+            'client_id': client_id,
+            'document_count': len(documents),
+            'prompt_tokens': merged['input_tokens'],
+            'completion_tokens': merged['output_tokens'],
+            'total_tokens': merged['tokens'],
+            'model': model,
+            'api_calls': api_calls,
+            'input_cost': merged['input_cost'],
+            'output_cost': merged['output_cost'],
+            'total_cost': merged['total_cost'],
+            'ip_address': ip_address or 'N/A',
+            'processing_time': merged['time'],
+            'chrClientIntDocIds': client_int_doc_ids,
+            'chrJournalDocIds': journal_doc_ids,
+            'intInternalDocId': internal_doc_id,
+            'chrReportType': "MONTHLY" if generate_fn is generate_monthly_report_summaries else report_type
+        })
+        log_debug(f"[SUMMARIZER] Database logging completed ({api_calls} batch requests)")
+    
+    return merged
 
 
 def generate_slutrapport_summaries(documents, section_names, model, max_tokens=4000, ip_address=None,
                                    client_int_doc_ids=None, journal_doc_ids=None, internal_doc_id=None,
-                                   client_id=0, cust_id=0, user_id=0, report_type=None):
+                                   client_id=0, cust_id=0, user_id=0, report_type=None, log_usage=True):
     """
     Generate summaries for Slutrapport (Final Report)
     Original functionality - unchanged
@@ -342,13 +428,13 @@ def generate_slutrapport_summaries(documents, section_names, model, max_tokens=4
     return _execute_openai_request(
         prompt, model, max_tokens, section_names, documents, language,
         ip_address, client_int_doc_ids, journal_doc_ids, internal_doc_id,
-        client_id, cust_id, user_id, report_type
+        client_id, cust_id, user_id, report_type, log_usage
     )
 
 
 def generate_monthly_report_summaries(documents, section_names, model, max_tokens=4000, ip_address=None,
                                       client_int_doc_ids=None, journal_doc_ids=None, internal_doc_id=None,
-                                      client_id=0, cust_id=0, user_id=0, report_type=None):
+                                      client_id=0, cust_id=0, user_id=0, report_type=None, log_usage=True):
     """
     Generate summaries for Monthly Report (Månadsrapport)
     Handles journal entries with merged JournalText + CorrectedText
@@ -401,15 +487,16 @@ RETURN JSON FORMAT:
     return _execute_openai_request(
         prompt, model, max_tokens, section_names, documents, language,
         ip_address, client_int_doc_ids, journal_doc_ids, internal_doc_id,
-        client_id, cust_id, user_id, "MONTHLY"
+        client_id, cust_id, user_id, "MONTHLY", log_usage
     )
 
 
 def _execute_openai_request(prompt, model, max_tokens, section_names, documents, language,
                             ip_address, client_int_doc_ids, journal_doc_ids, internal_doc_id,
-                            client_id, cust_id, user_id, report_type):
+                            client_id, cust_id, user_id, report_type, log_usage=True):
     """
     Common function to execute OpenAI request and process response
+    (log_usage=False leaves the database row to the caller)
     """
     try:
         start_time = time.time()
@@ -511,8 +598,9 @@ def _execute_openai_request(prompt, model, max_tokens, section_names, documents,
             'intInternalDocId': internal_doc_id,
             'chrReportType': report_type
         }
-        log_to_database(log_data)
-        log_debug(f"[SUMMARIZER] [{report_type}] Database logging completed")
+        if log_usage:
+            log_to_database(log_data)
+            log_debug(f"[SUMMARIZER] [{report_type}] Database logging completed")
         
         return {
             'section_bullets': section_bullets,
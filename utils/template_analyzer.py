@@ -6,6 +6,8 @@ Ignores title text like "Slutrapport", "Månadsrapport"
 """
 
 from bs4 import BeautifulSoup, NavigableString
+from functools import lru_cache
+import hashlib
 import re
 
 try:
@@ -239,9 +241,32 @@ def detect_text_based_sections(soup):
     return sections
 
 
+class _TemplateKey:
+    """lru_cache key that hashes/compares a template by digest instead of its full HTML"""
+    __slots__ = ('digest', 'html')
+
+    def __init__(self, html):
+        self.html = html
+        self.digest = hashlib.blake2b(html.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+    def __hash__(self):
+        return hash(self.digest)
+
+    def __eq__(self, other):
+        return isinstance(other, _TemplateKey) and self.digest == other.digest
+
+
+@lru_cache(maxsize=64)
+def _analyze_cached(key):
+    return _analyze(key.html)
+
+
 def analyze_template(template_html):
     """
-    Analyze template and detect sections
+    Analyze template and detect sections (memoized per template HTML)
+    
+    The returned soup and section elements are shared between calls for the
+    same template, so callers must treat them as read-only.
     
     Returns:
         dict: {
@@ -251,6 +276,12 @@ def analyze_template(template_html):
             'soup': BeautifulSoup object
         }
     """
+    result = _analyze_cached(_TemplateKey(template_html))
+    return dict(result, sections=list(result['sections']))
+
+
+def _analyze(template_html):
+    """Parse the template and detect its sections (uncached)"""
     soup = BeautifulSoup(template_html, 'html.parser')
     
     table_sections = detect_table_based_sections(soup)
@@ -364,6 +364,10 @@ def map_bullets_to_template(template_html, section_bullets_dict, template_struct
     elif template_type == 'text':
         from utils.template_analyzer import detect_text_based_sections
         sections = detect_text_based_sections(soup)
+    elif template_type == 'mixed':
+        # Never touch the analyzer's soup: it may be shared by the analysis cache
+        from utils.template_analyzer import detect_table_based_sections, detect_text_based_sections
+        sections = detect_table_based_sections(soup) + detect_text_based_sections(soup)
     
     # Map each section
     mapped_count = 0